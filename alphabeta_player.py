@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Alpha-beta Quoridor agent.
+
+A negamax search with alpha-beta pruning and iterative deepening, within
+the time budget given by TimeManager. The leaves are scored as get_score()
+does: the difference between the path lengths of the players, the walls
+left breaking the ties. Positions are stored in a transposition table keyed
+by the Zobrist hash of the board, and the moves are ordered by the best move
+of the table, then the killer moves of the ply, then the history heuristic.
+
+Only the walls crossing a shortest path of the opponent are searched: the
+others cannot make it any longer.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; version 2 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+from quoridor import *
+from time_manager import TimeManager
+from endgame import RACE_BUILDS, solve_race
+
+# Value of a won game, minus the number of plies needed to win it
+WIN = 10000
+# Plies beyond which a value is no longer taken for a won game
+MAX_PLY = 1000
+# Weight of one step of path difference, more than any difference of walls
+PATH_WEIGHT = 16
+INFINITY = WIN + 1
+
+# Kinds of bounds stored in the transposition table
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the budget of the move is spent."""
+
+
+class AlphaBetaAgent(IncrementalAgent):
+
+    """Negamax agent with alpha-beta pruning."""
+
+    def __init__(self, max_depth=None, table_size=1 << 20):
+        """
+        Arguments:
+        max_depth -- deepest iteration of the search, None for no limit
+            other than the time
+        table_size -- number of positions beyond which the transposition
+            table is cleared before a search
+        """
+        self.time_left = None
+        self.max_depth = max_depth
+        self.table_size = table_size
+        self.timer = TimeManager(max_budget=5.0)
+        # hash -> (depth, value, bound, best action)
+        self.table = {}
+        # action -> bonus of the moves that caused cutoffs
+        self.history = {}
+        self.killers = []
+        # Statistics of the last search
+        self.nodes = 0
+        self.depth = 0
+        self.depth_nodes = []
+        self.elapsed = 0.0
+
+    def options(self):
+        """Returns the keyword arguments recreating the same agent."""
+        return {'max_depth': self.max_depth, 'table_size': self.table_size}
+
+    def initialize(self, percepts, players, time_left):
+        self.table = {}
+        self.history = {}
+        return IncrementalAgent.initialize(self, percepts, players, time_left)
+
+    def play(self, percepts, player, step, time_left):
+        """
+        This function is used to play a move according
+        to the percepts, player and time left provided as input.
+        It must return an action representing the move the player
+        will perform.
+        :param percepts: dictionary representing the current board
+            in a form that can be fed to `dict_to_board()` in quoridor.py.
+        :param player: the player to control in this step (0 or 1)
+        :param step: the current step number, starting from 1
+        :param time_left: a float giving the number of seconds left from the time
+            credit. If the game is not time-limited, time_left is None.
+        :return: an action
+          eg: ('P', 5, 2) to move your pawn to cell (5,2)
+          eg: ('WH', 5, 2) to put a horizontal wall on corridor (5,2)
+          for more details, see `Board.get_actions()` in quoridor.py
+        """
+        self.player = player
+        self.step = step
+        self.time_left = time_left
+
+        # Pawn races are solved exactly, there is nothing to search
+        board = dict_to_bitboard(percepts)
+        winner, action, _ = solve_race(board, player)
+        if winner is not None:
+            return action
+
+        return self.search(board, player)
+
+    def search(self, board, player, depth=None):
+        """Searches board by iterative deepening and returns the best action
+        of player found by the deepest complete iteration. The search stops
+        when the time manager says so, or after the iteration of depth if
+        depth is given.
+        """
+        self.timer.start(board, player, self.time_left)
+        if len(self.table) > self.table_size:
+            self.table = {}
+        # Old cutoffs count less than the ones of this search
+        self.history = {action: bonus // 2
+                        for action, bonus in self.history.items() if bonus > 1}
+        self.killers = []
+        self.nodes = 0
+        self.depth = 0
+        self.depth_nodes = []
+        self.race_builds = RACE_BUILDS
+        limit = depth if depth is not None else self.max_depth
+        best = None
+        d = 0
+        while d != limit:
+            d += 1
+            nodes = self.nodes
+            try:
+                value, action = self.search_root(board, player, d,
+                                                 best is not None)
+            except SearchTimeout:
+                break
+            self.depth = d
+            self.depth_nodes.append(self.nodes - nodes)
+            best = action
+            if value is None or abs(value) >= WIN - MAX_PLY:
+                # No choice to make, or the game is decided
+                break
+            # The next iteration would most likely not finish in time
+            if depth is None and \
+                    self.timer.elapsed() >= self.timer.budget / 2:
+                break
+        self.elapsed = self.timer.elapsed()
+        if best is None:
+            best = self.ordered_actions(board, player, 0, None)[0]
+        return best
+
+    def search_root(self, board, player, depth, timed):
+        """Returns the pair (value, best action) of the search of board to
+        depth, the value being None if there is a single action to play.
+        SearchTimeout is raised if timed and the budget is spent.
+        """
+        self.timed = timed
+        entry = self.table.get(board.hash)
+        actions = self.ordered_actions(board, player, 0,
+                                       entry[3] if entry else None)
+        if len(actions) == 1:
+            return None, actions[0]
+        self.nodes += 1
+        alpha, beta = -INFINITY, INFINITY
+        best = None
+        for action in actions:
+            token = board.play_action_with_no_check(action, player)
+            try:
+                value = -self.negamax(board, 1 - player, depth - 1, -beta,
+                                      -alpha, 1)
+            finally:
+                board.undo_action(token)
+            if value > alpha:
+                alpha, best = value, action
+        self.table[board.hash] = (depth, alpha, EXACT, best)
+        return alpha, best
+
+    def negamax(self, board, player, depth, alpha, beta, ply):
+        """Returns the value of board for player, to move, searched to depth,
+        within the window (alpha, beta).
+        """
+        self.nodes += 1
+        if self.timed and not self.nodes & 255 and \
+                self.timer.elapsed() >= self.timer.budget:
+            raise SearchTimeout()
+        if board.is_finished():
+            # The opponent reached its goal on the last move
+            return -(WIN - ply)
+        winner, _, self.race_builds = solve_race(board, player,
+                                                 self.race_builds)
+        if winner is not None:
+            return WIN - ply if winner == player else -(WIN - ply)
+        if depth <= 0:
+            return self.evaluate(board, player)
+
+        alpha_orig = alpha
+        entry = self.table.get(board.hash)
+        tt_action = None
+        if entry is not None:
+            entry_depth, value, bound, tt_action = entry
+            if entry_depth >= depth:
+                value = from_table(value, ply)
+                if bound == EXACT:
+                    return value
+                elif bound == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        best = -INFINITY
+        best_action = None
+        for action in self.ordered_actions(board, player, ply, tt_action):
+            token = board.play_action_with_no_check(action, player)
+            try:
+                value = -self.negamax(board, 1 - player, depth - 1, -beta,
+                                      -alpha, ply + 1)
+            finally:
+                board.undo_action(token)
+            if value > best:
+                best, best_action = value, action
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.store_cutoff(action, depth, ply)
+                        break
+
+        if best <= alpha_orig:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table[board.hash] = (depth, to_table(best, ply), bound,
+                                  best_action)
+        return best
+
+    def evaluate(self, board, player):
+        """Returns the score of board for player as get_score() orders the
+        boards: by path difference first, then by difference of walls.
+        """
+        opponent = 1 - player
+        (x, y) = board.pawns[player]
+        steps = board.get_goal_distances(player)[x * SIZE + y]
+        (x, y) = board.pawns[opponent]
+        oppo_steps = board.get_goal_distances(opponent)[x * SIZE + y]
+        return PATH_WEIGHT * (oppo_steps - steps) + \
+            board.nb_walls[player] - board.nb_walls[opponent]
+
+    def store_cutoff(self, action, depth, ply):
+        """Records that action caused a cutoff at ply."""
+        while len(self.killers) <= ply:
+            self.killers.append([None, None])
+        killers = self.killers[ply]
+        if killers[0] != action:
+            killers[1] = killers[0]
+            killers[0] = action
+        self.history[action] = self.history.get(action, 0) + depth * depth
+
+    def ordered_actions(self, board, player, ply, tt_action):
+        """Returns the actions of player to search, best first: the action
+        of the transposition table, the killers of ply, then the others by
+        history, the pawn moves closest to the goal first among equals.
+        """
+        dist = board.get_goal_distances(player)
+        pawn_moves = board.get_legal_pawn_moves(player)
+        pawn_moves.sort(key=lambda action: dist[action[1] * SIZE + action[2]])
+        actions = pawn_moves + self.wall_moves(board, player)
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+
+        def priority(action):
+            if action == tt_action:
+                return 2, 0
+            if action in killers:
+                return 1, 0
+            return 0, history.get(action, 0)
+
+        # The sort is stable, so the pawn moves stay ahead among equals
+        actions.sort(key=priority, reverse=True)
+        return actions
+
+    def wall_moves(self, board, player):
+        """Returns the legal walls of player that cross a shortest path of
+        the opponent.
+        """
+        if board.nb_walls[player] <= 0:
+            return []
+        edges = board.get_path_edges(1 - player)
+        if edges is None:
+            # The pawn of player blocks every path, try all the walls
+            return board.get_legal_wall_moves(player)
+        (down, right) = edges
+        candidates = []
+        # A horizontal wall (x, y) closes the down edges of (x, y) and
+        # (x, y + 1), a vertical wall (x, y) the right edges of (x, y) and
+        # (x + 1, y)
+        while down:
+            bit = down & -down
+            down ^= bit
+            (x, y) = divmod(bit.bit_length() - 1, SIZE)
+            candidates += [('WH', x, y), ('WH', x, y - 1)]
+        while right:
+            bit = right & -right
+            right ^= bit
+            (x, y) = divmod(bit.bit_length() - 1, SIZE)
+            candidates += [('WV', x, y), ('WV', x - 1, y)]
+        return [action for action in dict.fromkeys(candidates)
+                if board.is_wall_possible_here(action[1:], action[0] == 'WH')]
+
+    def branching_factor(self):
+        """Returns the effective branching factor of the last search: the
+        ratio of the nodes of its last two iterations.
+        """
+        if len(self.depth_nodes) < 2 or not self.depth_nodes[-2]:
+            return 0.0
+        return self.depth_nodes[-1] / self.depth_nodes[-2]
+
+
+def to_table(value, ply):
+    """Returns value as stored in the table: the wins counted from the
+    position rather than from the root.
+    """
+    if value >= WIN - MAX_PLY:
+        return value + ply
+    if value <= -(WIN - MAX_PLY):
+        return value - ply
+    return value
+
+
+def from_table(value, ply):
+    """Returns the value of the table seen from ply."""
+    if value >= WIN - MAX_PLY:
+        return value - ply
+    if value <= -(WIN - MAX_PLY):
+        return value + ply
+    return value
+
+
+def add_arguments(agent, parser):
+    parser.add_argument("-d", "--max-depth", type=int, default=None,
+                        help="deepest iteration of the search" +
+                             " (default: no limit)")
+
+
+def setup(agent, parser, args):
+    if args.max_depth is not None and args.max_depth < 1:
+        parser.error("argument -d/--max-depth: must be at least 1")
+    agent.max_depth = args.max_depth
+
+
+if __name__ == "__main__":
+    agent_main(AlphaBetaAgent(), add_arguments, setup)
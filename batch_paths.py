@@ -0,0 +1,79 @@
+"""
+Goal distances of the pawns of many boards at once.
+
+The cell masks of quoridor.py are 81-bit integers, so many boards can be
+laid side by side in a single integer, each in a lane of 81 bits, and the
+breadth-first search of distance_layers() then runs on all of them at once.
+The lanes never leak into each other: a cell only leaves its lane by
+crossing the border of the board, and the border is part of the blocked
+masks. Each player of each board gets its own lane, searched from its goal
+row, and the search stops as soon as every pawn has been reached.
+
+A board is encoded by encode() as the tuple of its blocked edges and of
+the goal rows and cells of both players; nothing else is needed.
+
+The boards are searched CHUNK at a time. Every operation on the integer
+costs in proportion to its length, and all the lanes of an integer wait
+for the farthest pawn, so beyond about 16 boards a wider integer is slower
+per board (benchmark.py batch).
+"""
+
+from quoridor import SIZE, ROW_MASKS, UNREACHABLE, flood_step
+
+LANE = SIZE * SIZE
+
+# Boards searched in the same integer
+CHUNK = 12
+
+
+def encode(board):
+    """Return the encoding of board read by pawn_steps()."""
+    _, _, blocked_down, blocked_right = board.get_masks()
+    ((x0, y0), (x1, y1)) = board.pawns
+    return (blocked_down, blocked_right, board.goals[0], board.goals[1],
+            x0 * SIZE + y0, x1 * SIZE + y1)
+
+
+def pawn_steps(encoded):
+    """Return for each board of encoded the pair of the numbers of moves
+    players 0 and 1 need to reach their goal, ignoring the pawns, as
+    min_steps_before_victory() counts them; UNREACHABLE if they cannot.
+    """
+    if len(encoded) <= CHUNK:
+        return chunk_steps(encoded)
+    steps = []
+    for i in range(0, len(encoded), CHUNK):
+        steps.extend(chunk_steps(encoded[i:i + CHUNK]))
+    return steps
+
+
+def chunk_steps(encoded):
+    """pawn_steps() of boards searched in a single integer."""
+    blocked_down = blocked_right = frontier = pawns = 0
+    shift = 0
+    for (down, right, goal0, goal1, cell0, cell1) in encoded:
+        blocked_down |= (down << shift) | (down << (shift + LANE))
+        blocked_right |= (right << shift) | (right << (shift + LANE))
+        frontier |= (ROW_MASKS[goal0] << shift) | \
+            (ROW_MASKS[goal1] << (shift + LANE))
+        pawns |= (1 << (shift + cell0)) | (1 << (shift + LANE + cell1))
+        shift += 2 * LANE
+    steps = [UNREACHABLE] * (2 * len(encoded))
+    seen = frontier
+    d = 0
+    while True:
+        reached = frontier & pawns
+        if reached:
+            pawns ^= reached
+            while reached:
+                bit = reached & -reached
+                reached ^= bit
+                steps[(bit.bit_length() - 1) // LANE] = d
+            if not pawns:
+                break
+        frontier = flood_step(frontier, blocked_down, blocked_right) & ~seen
+        if not frontier:
+            break
+        seen |= frontier
+        d += 1
+    return list(zip(steps[0::2], steps[1::2]))
@@ -0,0 +1,843 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the Quoridor engine and agents.
+
+Every benchmark runs on a fixed set of positions obtained by playing seeded
+random games, so that two runs (or two versions of the code) can be compared.
+
+Usage: python3 benchmark.py BENCHMARK [options]
+"""
+
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+from quoridor import *
+from node_store import NodeStore, ROOT
+
+
+def random_positions(count, seed=42, wall_prob=0.4, max_steps=40):
+    """Return count boards reached by seeded random games.
+
+    Each game is stopped after a random number of steps so that the positions
+    cover the opening, the middle game and the end game.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = BitBoard()
+        player = PLAYER1
+        for _ in range(rng.randint(0, max_steps)):
+            if board.is_finished():
+                break
+            actions = board.get_legal_wall_moves(player)
+            if not actions or rng.random() > wall_prob:
+                actions = board.get_legal_pawn_moves(player)
+            board.play_action(rng.choice(actions), player)
+            player = 1 - player
+        if not board.is_finished():
+            positions.append((Board(board.__dict__), player))
+    return positions
+
+
+def measure(fn, repeat):
+    """Return the number of calls of fn per second."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return repeat / (time.perf_counter() - start)
+
+
+def report(name, rates):
+    """Print one line of results, the first rate being the reference."""
+    ref = rates[0][1]
+    cells = ["%s %10.0f/s (x%.1f)" % (label, rate, rate / ref)
+             for label, rate in rates]
+    print("%-28s %s" % (name, "  ".join(cells)))
+
+
+def bench_board(args):
+    """Compare the list-based Board with BitBoard."""
+    positions = random_positions(args.positions, args.seed)
+    engines = [("list", dict_to_board), ("bits", dict_to_bitboard)]
+    boards = [(name, [(convert(b.__dict__), p) for b, p in positions])
+              for name, convert in engines]
+
+    def run(name, op, repeat):
+        rates = []
+        for label, bs in boards:
+            def fn():
+                for board, player in bs:
+                    op(board, player)
+            rates.append((label, measure(fn, repeat) * len(bs)))
+        report(name, rates)
+
+    def pawn_moves(board, player):
+        (x, y) = board.pawns[player]
+        for pos in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            board.is_simplified_pawn_move_ok((x, y), pos)
+
+    def walls(board, player):
+        for i in range(8):
+            board.is_simplified_wall_possible_here((i, i), True)
+            board.is_simplified_wall_possible_here((i, 7 - i), False)
+
+    print("%d positions, seed %d" % (len(positions), args.seed))
+    run("is_simplified_pawn_move_ok", pawn_moves, args.repeat * 20)
+    run("is_simplified_wall_possible", walls, args.repeat * 20)
+    run("__str__", lambda b, p: str(b), args.repeat * 5)
+    run("clone", lambda b, p: b.clone(), args.repeat * 20)
+    run("get_shortest_path", lambda b, p: b.get_shortest_path(p),
+        args.repeat * 5)
+    run("get_actions", lambda b, p: b.get_actions(p), args.repeat)
+
+
+def search_legal_wall_moves(board, player):
+    """get_legal_wall_moves() as it was before flood fills: every candidate
+    wall is placed and two exact shortest path searches are run.
+    """
+    moves = []
+    if board.nb_walls[player] <= 0:
+        return moves
+    for i in range(8):
+        for j in range(8):
+            for kind, is_horiz in (('WH', True), ('WV', False)):
+                if not board.is_simplified_wall_possible_here((i, j),
+                                                              is_horiz):
+                    continue
+                board._push_wall((i, j), is_horiz)
+                try:
+                    board.get_shortest_path_astar(PLAYER1)
+                    board.get_shortest_path_astar(PLAYER2)
+                    moves.append((kind, i, j))
+                except NoPath:
+                    pass
+                finally:
+                    board._pop_wall((i, j), is_horiz)
+    return moves
+
+
+def flood_legal_wall_moves(board, player):
+    """get_legal_wall_moves() with the path check run on every candidate."""
+    if board.nb_walls[player] <= 0:
+        return []
+    return board._legal_wall_moves(-1, -1)
+
+
+def bench_walls(args):
+    """Compare get_legal_wall_moves() with the search based legality and
+    with flood fills run on every candidate wall.
+    """
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, seed %d" % (len(positions), args.seed))
+    for label, convert in (("list", dict_to_board),
+                           ("bits", dict_to_bitboard)):
+        boards = [(convert(b.__dict__), p) for b, p in positions]
+        for board, player in boards:
+            assert board.get_legal_wall_moves(player) == \
+                search_legal_wall_moves(board, player) == \
+                flood_legal_wall_moves(board, player)
+        rates = []
+        for name, fn in (("search", search_legal_wall_moves),
+                         ("flood", flood_legal_wall_moves),
+                         ("paths", type(boards[0][0]).get_legal_wall_moves)):
+            def run():
+                for board, player in boards:
+                    fn(board, player)
+            rates.append((name, measure(run, args.repeat) * len(boards)))
+        report("get_legal_wall_moves (%s)" % label, rates)
+
+
+def bench_paths(args):
+    """Compare the A* search with the cached goal distance maps."""
+    positions = random_positions(args.positions, args.seed)
+    boards = [(dict_to_bitboard(b.get_percepts()), p) for b, p in positions]
+    print("%d positions, seed %d" % (len(positions), args.seed))
+
+    def run(fn, repeat):
+        def loop():
+            for board, player in boards:
+                fn(board, player)
+        return measure(loop, repeat) * len(boards)
+
+    report("shortest path", [
+        ("astar", run(lambda b, p: b.get_shortest_path_astar(p),
+                      args.repeat * 5)),
+        ("map", run(lambda b, p: b.get_shortest_path(p), args.repeat * 50))])
+    report("min steps", [
+        ("astar", run(lambda b, p: len(b.get_shortest_path_astar(p)),
+                      args.repeat * 5)),
+        ("map", run(lambda b, p: b.min_steps_before_victory(p),
+                    args.repeat * 50))])
+
+
+def bench_undo(args):
+    """Compare expanding children with clone() and with play/undo."""
+    positions = random_positions(args.positions, args.seed)
+    boards = []
+    for b, p in positions:
+        board = dict_to_bitboard(b.get_percepts())
+        boards.append((board, p, board.get_actions(p)))
+    children = sum(len(actions) for _, _, actions in boards)
+    print("%d positions, %d children, seed %d" %
+          (len(positions), children, args.seed))
+
+    def clone_children():
+        # Each child keeps its own board, as a tree of boards does
+        kept = []
+        for board, player, actions in boards:
+            for action in actions:
+                child = board.clone()
+                child.play_action_with_no_check(action, player)
+                kept.append(child)
+        return kept
+
+    def undo_children():
+        for board, player, actions in boards:
+            for action in actions:
+                board.undo_action(
+                    board.play_action_with_no_check(action, player))
+
+    for name, fn in (("clone", clone_children), ("undo", undo_children)):
+        tracemalloc.start()
+        kept = fn()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        rate = measure(fn, args.repeat * 10) * children
+        print("%-28s %10.0f children/s %8.1f bytes/child kept"
+              " %8.1f bytes/child peak" %
+              (name, rate, size / children, peak / children))
+
+
+def bench_transpositions(args):
+    """Count the nodes MyAgent saves by sharing transpositions."""
+    from my_player import MyAgent
+    positions = random_positions(args.positions, args.seed)
+    agent = MyAgent()
+    created = shared = 0
+    print("%d positions, %d iterations, seed %d" %
+          (len(positions), args.iterations, args.seed))
+    for board, player in positions:
+        random.seed(args.seed)
+        agent.player = player
+        agent.mtc_search(board.get_percepts(), player, args.iterations)
+        created += agent.mcts.created_nodes
+        shared += agent.mcts.shared_nodes
+    print("%-28s %d" % ("nodes created", created))
+    print("%-28s %d" % ("nodes a tree would create", created + shared))
+    print("%-28s %.1f%%" % ("nodes saved",
+                            100.0 * shared / (created + shared)))
+
+
+def bench_tree(args):
+    """Measure the speed and the node stores of the search agents, see
+    mcts/harness.py.
+    """
+    from mcts import harness
+    harness.compare(harness.configurations(),
+                    random_positions(args.positions, args.seed),
+                    args.iterations, args.seed)
+
+
+def loop_select_edge(tree, node):
+    """select_edge() as the agents did it before: UCB1 computed child by
+    child, twice for the best ones, starting from a random child.
+    """
+    def average_score(child, parent_visit):
+        visit = tree.visit[child]
+        if visit > 0:
+            explore = math.sqrt(2) * \
+                math.sqrt(math.log(parent_visit) / visit) if parent_visit else 0
+            return (tree.score[child] / visit) + explore
+        return sys.maxsize
+
+    parent_visit = tree.visit[node]
+    selected = random.choice(tree.edge_range(node))
+    maxS = average_score(tree.child[selected], parent_visit)
+    for edge in tree.edge_range(node):
+        if average_score(tree.child[edge], parent_visit) > maxS:
+            maxS = average_score(tree.child[edge], parent_visit)
+            selected = edge
+    return selected
+
+
+def bench_selection(args):
+    """Compare the UCB1 selection of a child, child by child and in one
+    pass, on the nodes of search trees.
+    """
+    from mtc_player import MTCAgent
+    positions = random_positions(args.positions, args.seed)
+    agent = MTCAgent()
+    trees = []
+    for board, player in positions:
+        random.seed(args.seed)
+        agent.player = player
+        agent.mcts.reset()
+        agent.mtc_search(board.get_percepts(), player, args.iterations)
+        trees.append(agent.mcts.tree)
+    print("%d positions, %d iterations, seed %d" %
+          (len(positions), args.iterations, args.seed))
+    for name, width in (("all nodes", 1), ("wide nodes", 20)):
+        nodes = [(tree, node) for tree in trees for node in range(tree.size)
+                 if tree.count[node] >= width]
+        for tree, node in nodes:
+            # Both pick a child of the best value, if not the same one
+            chosen = [tree.child[select(tree, node)] for select in
+                      (loop_select_edge, NodeStore.select_edge)]
+            assert len({(tree.visit[child], tree.score[child])
+                        for child in chosen}) == 1 or \
+                not any(tree.visit[child] for child in chosen)
+        rates = []
+        for label, select in (("loop", loop_select_edge),
+                              ("pass", NodeStore.select_edge)):
+            def run():
+                for tree, node in nodes:
+                    select(tree, node)
+            rates.append((label, measure(run, args.repeat * 5) * len(nodes)))
+        report("%s (%d)" % (name, len(nodes)), rates)
+
+
+def checked_candidate_walls(board, player, opp_moves):
+    """The candidate walls of the Monte Carlo agents as they were before
+    wall_candidates.py: a list with duplicates, each candidate checked by
+    is_action_valid().
+    """
+    actions = []
+    for (wall_y, wall_x) in board.horiz_walls:
+        actions += [('WV', wall_y + 1, wall_x - 1),
+                    ('WV', wall_y + 1, wall_x - 1),
+                    ('WV', wall_y + 1, wall_x + 1),
+                    ('WV', wall_y, wall_x - 1), ('WV', wall_y, wall_x - 1),
+                    ('WV', wall_y, wall_x + 1)]
+    for (wall_y, wall_x) in board.verti_walls:
+        actions += [('WH', wall_y + 2, wall_x + 1),
+                    ('WH', wall_y + 2, wall_x - 1),
+                    ('WH', wall_y - 1, wall_x + 1),
+                    ('WH', wall_y - 1, wall_x - 1),
+                    ('WH', wall_y + 1, wall_x + 1),
+                    ('WH', wall_y + 1, wall_x - 1)]
+    for move in opp_moves:
+        actions += [('WH', move[0], move[1]), ('WH', move[0], move[1] - 1),
+                    ('WV', move[0], move[1] - 1),
+                    ('WV', move[0] + 1, move[1] - 1)]
+    oppo_y, oppo_x = board.pawns[1 - player]
+    if board.goals[1 - player] < oppo_y:
+        actions += [('WH', oppo_y - 1, oppo_x), ('WH', oppo_y - 1, oppo_x - 1)]
+    else:
+        actions += [('WH', oppo_y, oppo_x), ('WH', oppo_y, oppo_x - 1)]
+    return [action for action in actions
+            if board.is_action_valid(action, player)]
+
+
+def bench_candidates(args):
+    """Compare the candidate walls of wall_candidates.py, with an empty and
+    a full cache, with the candidates checked one by one.
+    """
+    import wall_candidates
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, seed %d" % (len(positions), args.seed))
+    boards = []
+    for board, player in positions:
+        board = dict_to_bitboard(board.get_percepts())
+        try:
+            boards.append((board, player, board.get_shortest_path(1 - player)))
+        except NoPath:
+            pass
+    for board, player, opp_moves in boards:
+        legal, unchecked = wall_candidates.candidate_walls(board, player,
+                                                           opp_moves)
+        valid = set(checked_candidate_walls(board, player, opp_moves))
+        assert set(legal) <= valid <= set(legal) | set(unchecked)
+
+    def checked():
+        for board, player, opp_moves in boards:
+            checked_candidate_walls(board, player, opp_moves)
+
+    def cold():
+        wall_candidates._layouts.clear()
+        warm()
+
+    def warm():
+        for board, player, opp_moves in boards:
+            wall_candidates.candidate_walls(board, player, opp_moves)
+
+    rates = [(name, measure(fn, args.repeat * 10) * len(boards))
+             for name, fn in (("checked", checked), ("cold", cold),
+                              ("cached", warm))]
+    report("candidate walls", rates)
+
+
+def bench_rollout(args):
+    """Measure simulated games, alone and as the evaluation of MTCAgent."""
+    from mtc_player import MTCAgent
+    from rollout import rollout
+    positions = random_positions(args.positions, args.seed)
+    boards = [(dict_to_bitboard(b.get_percepts()), p) for b, p in positions]
+    print("%d positions, %d iterations, seed %d" %
+          (len(positions), args.iterations, args.seed))
+    rng = random.Random(args.seed)
+    for wall_prob in (0.0, 0.2):
+        rates = []
+        for depth in (None, 16, 8):
+            def run():
+                for board, player in boards:
+                    rollout(board, player, depth, wall_prob, rng)
+            rates.append(("depth %s" % depth,
+                          measure(run, args.repeat * 5) * len(boards)))
+        report("rollouts, walls %.1f" % wall_prob, rates)
+
+    rates = []
+    for label, options in (("static", {}),
+                           ("full", {"rollouts": True}),
+                           ("depth 8", {"rollouts": True,
+                                        "rollout_depth": 8})):
+        agent = MTCAgent(**options)
+        iterations = 0
+        start = time.perf_counter()
+        for board, player in positions:
+            random.seed(args.seed)
+            agent.player = player
+            agent.mcts.reset()
+            agent.mtc_search(board.get_percepts(), player, args.iterations)
+            iterations += agent.iterations
+        rates.append((label, iterations / (time.perf_counter() - start)))
+    report("MTCAgent iterations", rates)
+
+
+def bench_batch(args):
+    """Compare the goal distances of leaves computed one board at a time
+    and in batches, alone and as the evaluation of MyAgent.
+    """
+    from batch_paths import encode, pawn_steps
+    from my_player import MyAgent
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, %d iterations, seed %d" %
+          (len(positions), args.iterations, args.seed))
+    percepts = [b.get_percepts() for b, _ in positions]
+    encoded = [encode(dict_to_bitboard(p)) for p in percepts]
+
+    def single():
+        # The boards of new leaves have no distance map cached yet
+        for p in percepts:
+            board = dict_to_bitboard(p)
+            board.min_steps_before_victory(0)
+            board.min_steps_before_victory(1)
+    rates = [("board", measure(single, args.repeat * 10) * len(percepts))]
+    for size in (1, 8, 32):
+        def batches():
+            for i in range(0, len(encoded), size):
+                pawn_steps(encoded[i:i + size])
+        rates.append(("batch %d" % size,
+                      measure(batches, args.repeat * 10) * len(encoded)))
+    report("goal distances", rates)
+
+    rates = []
+    for size in (1, 4, 8, 16, 32):
+        agent = MyAgent(batch_size=size)
+        iterations = 0
+        start = time.perf_counter()
+        for board, player in positions:
+            random.seed(args.seed)
+            agent.player = player
+            agent.mcts.reset()
+            agent.mtc_search(board.get_percepts(), player, args.iterations)
+            iterations += agent.iterations
+        rates.append(("batch %d" % size,
+                      iterations / (time.perf_counter() - start)))
+    report("MyAgent iterations", rates)
+
+
+# Pawn races with their winner: (name, pawns, horizontal walls, vertical
+# walls, player to move, winner), players 0 and 1 going to rows 8 and 0
+ENDGAMES = [
+    ("race, mover ahead", [(5, 0), (4, 8)], [], [], 0, 0),
+    ("race, tie goes to the mover", [(4, 0), (4, 8)], [], [], 1, 1),
+    ("race, one step behind", [(3, 0), (4, 8)], [], [], 0, 1),
+    ("face-off, jump first", [(3, 4), (4, 4)], [], [], 0, 0),
+    ("face-off, opponent jumps", [(3, 4), (4, 4)], [], [], 1, 1),
+    ("face-off, wall behind", [(3, 4), (4, 4)], [(4, 4)], [], 0, 1),
+    ("corridor face-off", [(2, 4), (6, 4)], [],
+     [(2, 3), (4, 3), (6, 3), (2, 4), (4, 4), (6, 4)], 0, 1),
+    ("corridor face-off, other side", [(2, 4), (6, 4)], [],
+     [(2, 3), (4, 3), (6, 3), (2, 4), (4, 4), (6, 4)], 1, 0),
+    ("detour around a wall", [(6, 4), (2, 0)], [(6, 3), (6, 5)], [], 0, 1),
+    ("detour, other side", [(6, 4), (2, 0)], [(6, 3), (6, 5)], [], 1, 1),
+    ("opponent on the goal row", [(7, 4), (8, 4)], [], [], 0, 0),
+    ("goal row behind a wall", [(7, 4), (8, 4)], [(7, 4)], [], 0, 0),
+]
+
+
+# Positions where a single action is legal, that the agents must find
+# within their time budget: (name, pawns, horizontal walls, vertical walls,
+# walls left, player to move, action)
+FORCED_MOVES = [
+    ("only move next to the opponent", [(7, 4), (8, 4)],
+     [(7, 0), (7, 2), (7, 5), (7, 7)], [(7, 3), (7, 4)], [0, 4], 0,
+     ('P', 6, 4)),
+]
+
+
+def bench_endgame(args):
+    """Check the race solver on endgames of known outcome and time it."""
+    from endgame import RaceSolver
+    from my_player import MyAgent
+    from mtc_player import MTCAgent
+    agents = [MyAgent(), MTCAgent()]
+    builds = solves = moves = 0.0
+    for name, pawns, horiz_walls, verti_walls, player, expected in ENDGAMES:
+        board = BitBoard({'pawns': pawns, 'goals': [8, 0],
+                          'nb_walls': [0, 0], 'horiz_walls': horiz_walls,
+                          'verti_walls': verti_walls})
+        distances = [board.get_goal_distances(p) for p in (0, 1)]
+        start = time.perf_counter()
+        solver = RaceSolver(board.goals, board.blocked_down,
+                            board.blocked_right, distances)
+        builds += time.perf_counter() - start
+        solves += 1 / measure(lambda: solver.solve(board.pawns, player),
+                              args.repeat * 500)
+        winner, length, action = solver.solve(board.pawns, player)
+        assert winner == expected, name
+        assert board.is_action_valid(action, player), name
+        for agent in agents:
+            start = time.perf_counter()
+            assert agent.play(board.get_percepts(), player, 1, None) == \
+                action, name
+            moves += time.perf_counter() - start
+        print("%-32s winner %d in %2d moves, plays %s" %
+              (name, winner, length, action))
+    for (name, pawns, horiz_walls, verti_walls, nb_walls, player,
+         expected) in FORCED_MOVES:
+        board = BitBoard({'pawns': pawns, 'goals': [8, 0],
+                          'nb_walls': nb_walls, 'horiz_walls': horiz_walls,
+                          'verti_walls': verti_walls})
+        assert board.get_actions(player) == [expected], name
+        for agent in agents:
+            # time_left giving a budget of args.budget for this move
+            timer = agent.mcts.timer
+            time_left = timer.safety_margin + \
+                args.budget * timer.moves_left(board, player)
+            agent.initialize(board.get_percepts(), [player], time_left)
+            start = time.perf_counter()
+            action = agent.play(board.get_percepts(), player, 1, time_left)
+            elapsed = time.perf_counter() - start
+            assert tuple(action) == expected, name
+            assert elapsed < timer.max_budget, name
+        print("%-32s plays %s" % (name, expected))
+    count = len(ENDGAMES)
+    print("%-32s %8.1f ms" % ("solver construction", 1000 * builds / count))
+    print("%-32s %8.1f us" % ("solve", 1e6 * solves / count))
+    print("%-32s %8.1f ms" % ("agent move", 1000 * moves / count / 2))
+
+
+def bench_parallel(args):
+    """Measure how root-parallel search scales with the number of workers."""
+    from my_player import MyAgent
+    from root_parallel import RootParallelSearch
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, %.1f s per move, seed %d" %
+          (len(positions), args.budget, args.seed))
+    ref = None
+    for workers in (1, 2, 4, 8):
+        search = RootParallelSearch(MyAgent, workers, args.seed)
+        search.start()
+        iterations = 0
+        start = time.perf_counter()
+        try:
+            for board, player in positions:
+                # time_left giving a budget of args.budget for this move
+                timer = MyAgent().mcts.timer
+                moves = timer.moves_left(board, player)
+                time_left = timer.safety_margin + args.budget * moves
+                search.search(board.get_percepts(), player, time_left)
+                iterations += search.iterations
+        finally:
+            search.close()
+        rate = iterations / (time.perf_counter() - start)
+        ref = ref or rate
+        print("%d workers %28.0f iterations/s (x%.1f)" %
+              (workers, rate, rate / ref))
+
+
+def bench_threads(args):
+    """Measure how the threads searching one tree scale, and check that
+    they find the same trees as a single thread when the GIL is enabled.
+    """
+    from my_player import MyAgent
+    from mcts.search import gil_enabled
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, %d iterations, seed %d, GIL %s" %
+          (len(positions), args.iterations, args.seed,
+           "enabled" if gil_enabled() else "disabled"))
+    ref = reference = None
+    for threads in (1, 2, 4, 8):
+        agent = MyAgent(threads=threads)
+        iterations = 0
+        trees = []
+        start = time.perf_counter()
+        for board, player in positions:
+            random.seed(args.seed)
+            agent.player = player
+            agent.mcts.reset()
+            agent.mtc_search(board.get_percepts(), player, args.iterations)
+            iterations += agent.iterations
+            trees.append(agent.mcts.tree.statistics(ROOT))
+        rate = iterations / (time.perf_counter() - start)
+        ref = ref or rate
+        reference = reference or trees
+        print("%d threads %28.0f iterations/s (x%.1f)  same trees: %s" %
+              (threads, rate, rate / ref, trees == reference))
+
+
+class EchoAgent(Agent):
+
+    """Agent rebuilding the board it receives and playing its first pawn
+    move, to time the transports rather than a search.
+    """
+
+    def play(self, percepts, player, step, time_left):
+        return dict_to_bitboard(percepts).get_legal_pawn_moves(player)[0]
+
+
+class PathAgent(Agent):
+
+    """Agent rebuilding the board it receives and following its shortest
+    path, to time whole games over the transports.
+    """
+
+    def play(self, percepts, player, step, time_left):
+        board = dict_to_bitboard(percepts)
+        return ('P',) + tuple(board.get_shortest_path(player)[0])
+
+
+class IncrementalPathAgent(IncrementalAgent, PathAgent):
+
+    """PathAgent keeping its board between the moves."""
+
+
+def bench_incremental(args):
+    """Compare the games of agents sent the whole board at every move with
+    those of incremental agents, sent the last action, over each transport.
+    """
+    import contextlib
+    import io
+    import os
+    import tempfile
+    import threading
+    import xmlrpc.client
+    from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+    import transport
+    from game import Game, connect_agent
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, seed %d" % (len(positions), args.seed))
+
+    class QuietHandler(SimpleXMLRPCRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    percepts = positions[0][0].get_percepts()
+    full = len(xmlrpc.client.dumps((percepts, 0, 1, 100.0), "play",
+                                   allow_none=True))
+    incremental = len(xmlrpc.client.dumps((("WH", 4, 4), 0, 1,
+                                           "%016x" % 0, 100.0),
+                                          "play_incremental",
+                                          allow_none=True))
+    print("%-28s %d bytes full, %d bytes incremental" %
+          ("xml-rpc request", full, incremental))
+    full = len(transport.encode_board(percepts)) + transport.PLAY.size
+    incremental = transport.ACTION.size + transport.INCREMENTAL.size
+    print("%-28s %d bytes full, %d bytes incremental" %
+          ("framed request", full + 1 + transport.FRAME.size,
+           incremental + 1 + transport.FRAME.size))
+
+    directory = tempfile.mkdtemp()
+    sockets = []
+    try:
+        for agent_class in (PathAgent, IncrementalPathAgent):
+            for name in ("xml-rpc", "tcp", "unix"):
+                servers = []
+                for player in range(2):
+                    if name == "xml-rpc":
+                        server = SimpleXMLRPCServer(("localhost", 0),
+                                                    QuietHandler,
+                                                    allow_none=True)
+                        server.register_instance(agent_class())
+                        uri = "http://localhost:%d" % server.server_address[1]
+                    elif name == "tcp":
+                        server = transport.make_server(agent_class(),
+                                                       "tcp://localhost:0")
+                        uri = "tcp://localhost:%d" % server.server_address[1]
+                    else:
+                        path = os.path.join(directory, "agent%d.sock" % player)
+                        sockets.append(path)
+                        uri = "unix://" + path
+                        server = transport.make_server(agent_class(), uri)
+                    threading.Thread(target=server.serve_forever,
+                                     daemon=True).start()
+                    servers.append((server, uri))
+                agents = [connect_agent(uri) for _, uri in servers]
+                moves = 0
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    for board, _ in positions:
+                        game = Game(agents, board.clone())
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            game.play()
+                        moves += len(game.trace.actions)
+                elapsed = time.perf_counter() - start
+                for agent in agents:
+                    if isinstance(agent, transport.FramedProxy):
+                        agent.close()
+                for server, _ in servers:
+                    server.shutdown()
+                    server.server_close()
+                label = "%s %s" % (name, "incremental"
+                                   if agent_class is IncrementalPathAgent
+                                   else "full")
+                print("%-28s %8.0f moves/s %8.1f us/move" %
+                      (label, moves / elapsed, 1e6 * elapsed / moves))
+    finally:
+        for path in sockets:
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rmdir(directory)
+
+
+def bench_transport(args):
+    """Compare the round trip of a move over XML-RPC and over the binary
+    transport, by TCP and by Unix socket.
+    """
+    import os
+    import tempfile
+    import threading
+    import xmlrpc.client
+    from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+    import transport
+    from game import connect_agent
+    positions = random_positions(args.positions, args.seed)
+    calls = [(board.get_percepts(), player) for board, player in positions]
+    print("%d positions, seed %d" % (len(positions), args.seed))
+
+    class QuietHandler(SimpleXMLRPCRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    agent = EchoAgent()
+    directory = tempfile.mkdtemp()
+    servers = []
+    xml_server = SimpleXMLRPCServer(("localhost", 0), QuietHandler,
+                                    allow_none=True)
+    xml_server.register_instance(agent)
+    servers.append(("xml-rpc", xml_server,
+                    "http://localhost:%d" % xml_server.server_address[1]))
+    tcp_server = transport.make_server(agent, "tcp://localhost:0")
+    servers.append(("tcp", tcp_server,
+                    "tcp://localhost:%d" % tcp_server.server_address[1]))
+    path = os.path.join(directory, "agent.sock")
+    servers.append(("unix", transport.make_server(agent, "unix://" + path),
+                    "unix://" + path))
+    for _, server, _ in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        percepts = calls[0][0]
+        xml_size = len(xmlrpc.client.dumps((percepts, 0, 1, 100.0), "play",
+                                           allow_none=True))
+        frame_size = len(transport.encode_board(percepts)) + \
+            transport.PLAY.size + 1 + transport.FRAME.size
+        print("%-28s %d bytes xml-rpc, %d bytes framed" %
+              ("request", xml_size, frame_size))
+        for name, _, uri in servers:
+            proxy = connect_agent(uri)
+            for percepts, player in calls:
+                assert tuple(proxy.play(percepts, player, 1, 100.0)) == \
+                    tuple(agent.play(percepts, player, 1, 100.0))
+
+            def moves():
+                for percepts, player in calls:
+                    proxy.play(percepts, player, 1, 100.0)
+            rate = measure(moves, args.repeat * 10) * len(calls)
+            print("%-28s %8.0f moves/s %8.1f us/move" %
+                  (name, rate, 1e6 / rate))
+            if isinstance(proxy, transport.FramedProxy):
+                # Each open connection keeps a thread of the server
+                proxy.close()
+    finally:
+        for _, server, _ in servers:
+            server.shutdown()
+            server.server_close()
+        os.unlink(path)
+        os.rmdir(directory)
+
+
+def bench_alphabeta(args):
+    """Measure the speed and the effective branching factor of the
+    alpha-beta agent searching to fixed depths.
+    """
+    from alphabeta_player import AlphaBetaAgent
+    positions = random_positions(args.positions, args.seed)
+    print("%d positions, seed %d" % (len(positions), args.seed))
+    previous = None
+    for depth in range(1, args.depth + 1):
+        agent = AlphaBetaAgent()
+        nodes = 0
+        start = time.perf_counter()
+        for board, player in positions:
+            agent.table = {}
+            agent.history = {}
+            agent.search(dict_to_bitboard(board.get_percepts()), player,
+                         depth)
+            nodes += agent.nodes
+        elapsed = time.perf_counter() - start
+        ebf = "%6.2f" % (nodes / previous) if previous else "     -"
+        print("depth %d %10d nodes %8.0f nodes/s  branching factor %s" %
+              (depth, nodes, nodes / elapsed, ebf))
+        previous = nodes
+
+
+BENCHMARKS = {
+    "board": bench_board,
+    "walls": bench_walls,
+    "paths": bench_paths,
+    "undo": bench_undo,
+    "transpositions": bench_transpositions,
+    "tree": bench_tree,
+    "selection": bench_selection,
+    "candidates": bench_candidates,
+    "rollout": bench_rollout,
+    "batch": bench_batch,
+    "endgame": bench_endgame,
+    "parallel": bench_parallel,
+    "threads": bench_threads,
+    "transport": bench_transport,
+    "incremental": bench_incremental,
+    "alphabeta": bench_alphabeta,
+}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS),
+                        help="benchmark to run")
+    parser.add_argument("-n", "--positions", type=int, default=20,
+                        help="number of positions (default: %(default)s)")
+    parser.add_argument("-r", "--repeat", type=int, default=2,
+                        help="repetitions of the slowest operation" +
+                             " (default: %(default)s)")
+    parser.add_argument("-i", "--iterations", type=int, default=300,
+                        help="search iterations per position" +
+                             " (default: %(default)s)")
+    parser.add_argument("-b", "--budget", type=float, default=0.5,
+                        help="search time per move in seconds" +
+                             " (default: %(default)s)")
+    parser.add_argument("-d", "--depth", type=int, default=3,
+                        help="deepest alpha-beta search" +
+                             " (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="seed of the random positions" +
+                             " (default: %(default)s)")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,199 @@
+"""
+Exact solver of the pawn races that end the games.
+
+Once both players have placed all their walls, the walls cannot change any
+more and the rest of the game only depends on the cells of the two pawns and
+on the player to move: 2 * 81 * 81 positions. RaceSolver solves all of them
+at once by retrograde analysis, from the positions where a pawn stands on its
+goal row back to the ones leading to them, so that a race is then looked up
+in constant time. The pawn moves, jumps included, follow is_pawn_move_ok().
+
+The races that can last forever, the pawns blocking each other, are draws.
+"""
+
+from array import array
+
+from quoridor import SIZE, cell_neighbours, pawn_targets
+
+# Outcomes of a race for the player to move
+WIN = 1
+LOSS = -1
+DRAW = 0
+
+# Number of wall layouts whose races are kept by race_solver()
+MAX_SOLVERS = 8
+# Solvers of new wall layouts that a search may build, see solve_race()
+RACE_BUILDS = 1
+
+_solvers = {}
+
+
+class RaceSolver:
+
+    """Outcome of every pawn race with one wall layout.
+
+    A race is indexed by (player * 81 + cell0) * 81 + cell1 where player is
+    the player to move and cell0 and cell1 are the cells x * 9 + y of the
+    pawns of players 0 and 1. result gives the outcome for the player to
+    move and depth the number of moves until the end with the best play:
+    the winner hurries and the loser delays the end as much as it can.
+    The races left DRAW by the analysis are the ones that never end.
+    """
+
+    def __init__(self, goals, blocked_down, blocked_right, distances=None):
+        """
+        Arguments:
+        goals -- the goal rows of the players
+        blocked_down, blocked_right -- the edge masks of the walls, see
+            wall_masks() in quoridor.py
+        distances -- the goal distances of both players, as given by
+            get_goal_distances(), to prefer the moves getting closer to the
+            goal among the equivalent ones
+        """
+        cells = SIZE * SIZE
+        self.goals = tuple(goals)
+        self.distances = distances
+        self.neighbours = [cell_neighbours(cell, blocked_down, blocked_right)
+                           for cell in range(cells)]
+        races = 2 * cells * cells
+        self.result = array('b', bytes(races))
+        self.depth = array('H', bytes(2 * races))
+        moves_left = bytearray(races)
+        previous = [[] for _ in range(races)]
+        done = []
+        goal0 = [cell // SIZE == goals[0] for cell in range(cells)]
+        goal1 = [cell // SIZE == goals[1] for cell in range(cells)]
+        pawn_moves = self.pawn_moves
+        for player in (0, 1):
+            for cell0 in range(cells):
+                for cell1 in range(cells):
+                    if cell0 == cell1:
+                        continue
+                    race = (player * cells + cell0) * cells + cell1
+                    if goal0[cell0] or goal1[cell1]:
+                        # The winner is the player who just moved
+                        self.result[race] = LOSS
+                        done.append(race)
+                        continue
+                    if player == 0:
+                        nexts = [(cells + cell) * cells + cell1
+                                 for cell in pawn_moves(cell0, cell1)]
+                    else:
+                        nexts = [cell0 * cells + cell
+                                 for cell in pawn_moves(cell1, cell0)]
+                    moves_left[race] = len(nexts)
+                    for race_ in nexts:
+                        previous[race_].append(race)
+        # Positions are solved by increasing number of moves to the end
+        result, depth = self.result, self.depth
+        for race in done:
+            d = depth[race] + 1
+            if result[race] == LOSS:
+                for race_ in previous[race]:
+                    if result[race_] == DRAW:
+                        result[race_] = WIN
+                        depth[race_] = d
+                        done.append(race_)
+            else:
+                for race_ in previous[race]:
+                    if result[race_] == DRAW:
+                        moves_left[race_] -= 1
+                        if not moves_left[race_]:
+                            result[race_] = LOSS
+                            depth[race_] = d
+                            done.append(race_)
+
+    def pawn_moves(self, cell, other):
+        """Return the cells a pawn in cell can move to when the other pawn
+        is in other.
+        """
+        return pawn_targets(cell, other, self.neighbours.__getitem__)
+
+    def index(self, pawns, player):
+        cells = SIZE * SIZE
+        ((x0, y0), (x1, y1)) = pawns
+        return (player * cells + x0 * SIZE + y0) * cells + x1 * SIZE + y1
+
+    def solve(self, pawns, player):
+        """Return the tuple (winner, moves, action) of the race with the
+        pawns in pawns and player to move: the winner, None for a draw, the
+        number of moves until the end and the best action of player.
+        """
+        race = self.index(pawns, player)
+        if self.result[race] == DRAW:
+            return None, 0, self.best_action(pawns, player)
+        winner = player if self.result[race] == WIN else 1 - player
+        return winner, self.depth[race], self.best_action(pawns, player)
+
+    def best_action(self, pawns, player):
+        """Return the best action of player, None if the race is over."""
+        cells = SIZE * SIZE
+        (x, y) = pawns[player]
+        cell = x * SIZE + y
+        (x, y) = pawns[1 - player]
+        other = x * SIZE + y
+        if cell // SIZE == self.goals[player] or \
+                other // SIZE == self.goals[1 - player]:
+            return None
+        distances = self.distances[player] if self.distances else None
+        best = None
+        best_key = None
+        for target in self.pawn_moves(cell, other):
+            if player == 0:
+                race = (cells + target) * cells + other
+            else:
+                race = other * cells + target
+            # Win soon, else draw, else lose late; outcomes are for the
+            # opponent, to move after target
+            if self.result[race] == DRAW:
+                key = (1, 0)
+            elif self.result[race] == LOSS:
+                key = (2, -self.depth[race])
+            else:
+                key = (0, self.depth[race])
+            key += (-distances[target] if distances else 0,)
+            if best_key is None or key > best_key:
+                best, best_key = target, key
+        if best is None:
+            return None
+        return ('P', best // SIZE, best % SIZE)
+
+
+def race_solver(board, build=True):
+    """Return the RaceSolver of the walls of board, or None if a player
+    still has walls to place. The solvers of the last MAX_SOLVERS wall
+    layouts are kept; if build is False, None is returned rather than
+    building a new one.
+    """
+    if board.nb_walls[0] > 0 or board.nb_walls[1] > 0:
+        return None
+    _, _, blocked_down, blocked_right = board.get_masks()
+    key = (tuple(board.goals), blocked_down, blocked_right)
+    solver = _solvers.get(key)
+    if solver is None and build:
+        if len(_solvers) >= MAX_SOLVERS:
+            del _solvers[next(iter(_solvers))]
+        distances = [board.get_goal_distances(player) for player in (0, 1)]
+        solver = _solvers[key] = RaceSolver(board.goals, blocked_down,
+                                            blocked_right, distances)
+    return solver
+
+
+def solve_race(board, player, builds=RACE_BUILDS):
+    """Return the triple (winner, action, builds left) of board with player
+    to move: the winner and the best action of player if board is a pawn
+    race with a winner, None and None otherwise. The solver of a new wall
+    layout is only built if builds is positive, and costs one of them.
+    """
+    if board.nb_walls[0] > 0 or board.nb_walls[1] > 0:
+        return None, None, builds
+    solver = race_solver(board, build=False)
+    if solver is None and builds > 0:
+        builds -= 1
+        solver = race_solver(board)
+    if solver is None:
+        return None, None, builds
+    winner, _, action = solver.solve(board.pawns, player)
+    if winner is None:
+        action = None
+    return winner, action, builds
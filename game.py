@@ -25,6 +25,7 @@ import xmlrpc.client
 import pickle
 
 from quoridor import *
+import transport
 
 
 class TimeCreditExpired(Exception):
@@ -213,6 +214,9 @@ class Game:
         self.step = 0
         self.player = 0
         self.trace = Trace(board, credits)
+        # Agents sent only the last action, see quoridor.IncrementalAgent
+        self.incremental = [False, False]
+        self.last_action = None
 
     def play(self):
         """Play the game."""
@@ -221,21 +225,21 @@ class Game:
         try:
             for agent in range(2):
                 logging.debug("Initializing agent %d", agent)
-                self.timed_exec("initialize",
-                    self.board,
+                result, _ = self.timed_exec("initialize",
+                    self.board.get_percepts(),
                     [agent, agent + 2],
                     agent=agent)
+                self.incremental[agent] = isinstance(result, dict) and \
+                    bool(result.get('incremental'))
 
             while not self.board.is_finished():
                 self.step += 1
                 logging.debug("Asking player %d to play step %d",
                               self.player, self.step)
                 self.viewer.playing(self.step, self.player)
-                action, t = self.timed_exec("play",
-                    self.board,
-                    self.player,
-                    self.step)
+                action, t = self.ask_action()
                 self.board.play_action(action, self.player)
+                self.last_action = action
                 self.viewer.update(self.step, action, self.player)
                 self.trace.add_action(self.player, action, t)
                 self.player = (self.player + 1) % 2
@@ -264,6 +268,34 @@ class Game:
         self.trace.set_winner(winner, reason)
         self.viewer.finished(self.step, winner, reason)
 
+    def ask_action(self):
+        """Ask the current player for its action.
+
+        Return a tuple (action, t) as timed_exec(). Incremental agents are
+        sent the last action and the hash of the board, and the whole board
+        only when their own board does not match it.
+
+        """
+        if not self.incremental[self.player]:
+            return self.timed_exec("play",
+                self.board.get_percepts(),
+                self.player,
+                self.step)
+        action, t = self.timed_exec("play_incremental",
+            self.last_action,
+            self.player,
+            self.step,
+            "%016x" % self.board.compute_hash())
+        if action is None:
+            logging.warning("Board of agent %d out of sync at step %d",
+                            self.player, self.step)
+            action, t_resync = self.timed_exec("resync",
+                self.board.get_percepts(),
+                self.player,
+                self.step)
+            t += t_resync
+        return (action, t)
+
     def timed_exec(self, fn, *args, agent=None):
         """Execute self.agents[agent].fn(*args, time_left) with the
         time limit for the current player.
@@ -288,7 +320,8 @@ class Game:
         except socket.timeout:
             self.credits[agent] = -1.0  # ensure it is counted as expired
             raise TimeCreditExpired
-        except (socket.error, xmlrpc.client.Fault) as e:
+        except (socket.error, xmlrpc.client.Fault,
+                transport.RemoteError) as e:
             logging.error("Agent %d was unable to play step %d." +
                     " Reason: %s", agent, self.step, e)
             raise InvalidAction
@@ -306,7 +339,12 @@ class Game:
 
 
 def connect_agent(uri):
-    """Connect to a remote player and return a proxy for the Player object."""
+    """Connect to a remote player and return a proxy for the Player object.
+    tcp:// and unix:// URIs use the binary transport of transport.py, the
+    others XML-RPC.
+    """
+    if transport.is_framed(uri):
+        return transport.FramedProxy(uri)
     return xmlrpc.client.ServerProxy(uri, allow_none=True)
 
 
@@ -324,11 +362,13 @@ if __name__ == "__main__":
         usage="%(prog)s [options] AGENT1 AGENT2\n" +
               "       %(prog)s [options] -r FILE")
     parser.add_argument("agent1", nargs='?', default='human',
-                        help="URI of the first agent (blue player) or" +
+                        help="URI of the first agent (blue player): http://," +
+                             " tcp://HOST:PORT or unix://PATH, or" +
                              " keyword 'human' (default: human)",
                         metavar="AGENT1")
     parser.add_argument("agent2", nargs='?', default='human',
-                        help="URI of the second agent (red player) or" +
+                        help="URI of the second agent (red player): http://," +
+                             " tcp://HOST:PORT or unix://PATH, or" +
                              " keyword 'human' (default: human)",
                         metavar="AGENT2")
     parser.add_argument("-v", "--verbose", action="store_true", default=False,
@@ -0,0 +1,15 @@
+"""
+Monte Carlo tree search of the Quoridor agents.
+
+MCTS runs the search over a NodeStore; the choice of the child to follow,
+the actions searched from a node, the score of a leaf and the time spent
+are given by policies, see mcts/policies.py. MCTSAgent plays the actions of
+a search, and the agents of my_player.py and mtc_player.py are
+configurations of it. python3 -m mcts.harness compares the configurations
+on the same positions.
+"""
+
+from mcts.policies import (UCB1, CandidateExpansion, PathEvaluation,
+                           RolloutEvaluation)
+from mcts.search import MCTS
+from mcts.agent import MCTSAgent
@@ -0,0 +1,119 @@
+"""
+Agent playing the actions of an MCTS.
+"""
+
+from quoridor import IncrementalAgent, dict_to_bitboard
+from endgame import solve_race
+import root_parallel
+
+
+class MCTSAgent(IncrementalAgent):
+
+    """Quoridor agent searching each move with an MCTS.
+
+    The subclasses configure the search; options() gives the keyword
+    arguments recreating the same agent in the worker processes of the
+    root-parallel search.
+    """
+
+    def __init__(self, mcts, workers=1):
+        """
+        Arguments:
+        mcts -- the MCTS searching the moves
+        workers -- number of processes of the search
+        """
+        self.mcts = mcts
+        self.time_left = None
+        self.iterations = 0
+        # Root-parallel search over a process pool when workers > 1
+        self.workers = workers
+        self.parallel = None
+
+    def options(self):
+        """Returns the keyword arguments of the agents of the workers."""
+        return {'threads': self.mcts.threads}
+
+    def initialize(self, percepts, players, time_left):
+        self.mcts.reset()
+        self.start_workers()
+        return IncrementalAgent.initialize(self, percepts, players, time_left)
+
+    def start_workers(self):
+        """Starts the worker processes of the root-parallel search."""
+        if self.workers > 1:
+            if self.parallel is None:
+                self.parallel = root_parallel.RootParallelSearch(
+                    type(self), self.workers, options=self.options())
+            self.parallel.start()
+
+    def play(self, percepts, player, step, time_left):
+        """
+        This function is used to play a move according
+        to the percepts, player and time left provided as input.
+        It must return an action representing the move the player
+        will perform.
+        :param percepts: dictionary representing the current board
+            in a form that can be fed to `dict_to_board()` in quoridor.py.
+        :param player: the player to control in this step (0 or 1)
+        :param step: the current step number, starting from 1
+        :param time_left: a float giving the number of seconds left from the time
+            credit. If the game is not time-limited, time_left is None.
+        :return: an action
+          eg: ('P', 5, 2) to move your pawn to cell (5,2)
+          eg: ('WH', 5, 2) to put a horizontal wall on corridor (5,2)
+          for more details, see `Board.get_actions()` in quoridor.py
+        """
+        self.player = player
+        self.step = step
+        self.time_left = time_left
+
+        # Pawn races are solved exactly, there is nothing to search
+        board = dict_to_bitboard(percepts)
+        winner, action, _ = solve_race(board, player)
+        if winner is not None:
+            return action
+
+        if self.workers > 1:
+            return self.parallel_search(percepts, player)
+        return self.mtc_search(percepts, player)
+
+    def mtc_search(self, percepts, player, limit=None):
+        """Searches percepts in this process and returns the best action of
+        player, after limit iterations if limit is given.
+        """
+        action = self.mcts.search(dict_to_bitboard(percepts), player,
+                                  self.time_left, limit)
+        self.iterations = self.mcts.iterations
+        return action
+
+    def parallel_search(self, percepts, player):
+        """Searches percepts in every worker process and returns the action
+        of the child of the root most visited by all of them.
+        """
+        self.start_workers()
+        statistics = self.parallel.search(percepts, player, self.time_left)
+        self.iterations = self.parallel.iterations
+        if not statistics:
+            # No action of the expansion policy was legal, see MCTS.search()
+            return dict_to_bitboard(percepts).get_legal_pawn_moves(player)[0]
+        action, _, _ = max(statistics, key=lambda child: child[1])
+        return action
+
+
+def add_arguments(agent, parser):
+    """args_cb of agent_main() adding the options of the search."""
+    root_parallel.add_arguments(agent, parser)
+    parser.add_argument("-t", "--threads", type=int, default=1,
+                        help="number of threads searching the tree of each" +
+                             " process (default: %(default)s)")
+
+
+def setup(agent, parser, args):
+    """setup_cb of agent_main() applying the options of the search."""
+    if args.threads < 1:
+        parser.error("argument -t/--threads: must be at least 1")
+    if args.threads > 1 and agent.mcts.batch_size > 1:
+        parser.error("argument -t/--threads: batches are searched by a" +
+                     " single thread")
+    agent.mcts.threads = args.threads
+    root_parallel.setup(agent, parser, args)
@@ -0,0 +1,97 @@
+"""
+Comparison of search configurations on the same positions.
+
+Each configuration is an MCTS searching every position for a fixed number
+of iterations, from the same seed, so that two configurations (or two
+versions of the code) do the same work. The harness reports the speed of
+the searches and the memory of their trees: the bytes of the node stores,
+the bytes still allocated once a search is over and the peak during it.
+
+Usage: python3 -m mcts.harness [options]
+"""
+
+import random
+import time
+import tracemalloc
+
+from quoridor import dict_to_bitboard
+
+
+def configurations():
+    """Return the list of (name, mcts) of the searches of the agents."""
+    from my_player import MyAgent
+    from mtc_player import MTCAgent
+    return [(agent_class.__name__, agent_class().mcts)
+            for agent_class in (MyAgent, MTCAgent)]
+
+
+def run(mcts, positions, iterations, seed):
+    """Search every position of positions, a list of (board, player), with
+    mcts for iterations iterations and return the iterations made.
+    """
+    done = 0
+    for board, player in positions:
+        random.seed(seed)
+        mcts.reset()
+        mcts.search(dict_to_bitboard(board.get_percepts()), player, None,
+                    iterations)
+        done += mcts.iterations
+    return done
+
+
+def measure(mcts, positions, iterations, seed):
+    """Return the statistics of the searches of positions by mcts: a
+    dictionary of the iterations per second, the nodes of the trees, and
+    their bytes per node used and allocated by the stores, kept once the
+    search is over and at the peak of the search.
+    """
+    start = time.perf_counter()
+    done = run(mcts, positions, iterations, seed)
+    rate = done / (time.perf_counter() - start)
+
+    nodes = used = allocated = kept = peak = 0
+    for board, player in positions:
+        tracemalloc.start()
+        run(mcts, [(board, player)], iterations, seed)
+        size, top = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tree = mcts.tree
+        nodes += tree.size
+        used += tree.nbytes(used=True)
+        allocated += tree.nbytes()
+        kept += size
+        peak = max(peak, top)
+    return {"rate": rate, "nodes": nodes, "used": used / nodes,
+            "allocated": allocated / nodes, "kept": kept / nodes,
+            "peak": peak}
+
+
+def compare(configurations, positions, iterations, seed):
+    """Print the statistics of each (name, mcts) of configurations."""
+    print("%d positions, %d iterations, seed %d" %
+          (len(positions), iterations, seed))
+    for name, mcts in configurations:
+        stats = measure(mcts, positions, iterations, seed)
+        print("%-10s %8.0f iterations/s %6d nodes %6.1f bytes/node used"
+              " %6.1f allocated %6.1f kept %8.1f KiB peak" %
+              (name, stats["rate"], stats["nodes"], stats["used"],
+               stats["allocated"], stats["kept"], stats["peak"] / 1024))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from benchmark import random_positions
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--positions", type=int, default=20,
+                        help="number of positions (default: %(default)s)")
+    parser.add_argument("-i", "--iterations", type=int, default=300,
+                        help="search iterations per position" +
+                             " (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=42,
+                        help="seed of the random positions" +
+                             " (default: %(default)s)")
+    args = parser.parse_args()
+    compare(configurations(), random_positions(args.positions, args.seed),
+            args.iterations, args.seed)
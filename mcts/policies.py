@@ -0,0 +1,131 @@
+"""
+Policies plugged into MCTS.
+
+A search is configured by four objects:
+- the selection policy picks the edge to follow down from a node:
+  select(tree, node, exclude) returns an edge of node, or None;
+- the expansion policy gives the actions searched from a position:
+  actions(board, player) returns the pair (actions, unchecked) of
+  NodeStore.add_edges(), the walls that may be illegal first;
+- the evaluation policy scores a leaf that is not a proven race:
+  evaluate(board, player, root_player) returns the score of board, with
+  player to move, for root_player. The policies that can score many
+  leaves at once also provide encode(board, player, root_player), the
+  part of the leaf they need, and evaluate_batch(items), the scores of a
+  list of encoded leaves;
+- the time policy decides when the search stops, with the interface of
+  TimeManager: start(board, player, time_left) and
+  should_stop(iterations, child_visits).
+"""
+
+from quoridor import NoPath
+from rollout import rollout
+from batch_paths import encode, pawn_steps
+from wall_candidates import candidate_walls
+
+
+class UCB1:
+
+    """Selection of the child of highest UCB1 value."""
+
+    def select(self, tree, node, exclude=()):
+        return tree.select_edge(node, exclude)
+
+
+class CandidateExpansion:
+
+    """The first step of the shortest path of the player, and the walls of
+    candidate_walls() when the player is not ahead and has walls left.
+    """
+
+    def actions(self, board, player):
+        """Returns the pair (actions, unchecked) of the actions of player to
+        search, the walls that may be illegal being the first unchecked ones.
+        """
+        try:
+            opp_moves = board.get_shortest_path(1 - player)
+            my_moves = board.get_shortest_path(player)
+        except NoPath:
+            # A pawn stands on the only way to a goal, there is no first
+            # step to take: search the legal pawn moves
+            return board.get_legal_pawn_moves(player), 0
+
+        legal, unchecked = self.wall_actions(board, player, opp_moves,
+                                             my_moves)
+        moves = self.move_actions(board, player, opp_moves, my_moves)
+        return unchecked + moves + legal, len(unchecked)
+
+    def wall_actions(self, board, player, opp_moves, my_moves):
+        if board.nb_walls[player] == 0:
+            return [], []
+
+        # No wall while the shortest path of player is the shorter one
+        if len(my_moves) < len(opp_moves):
+            return [], []
+
+        return candidate_walls(board, player, opp_moves)
+
+    def move_actions(self, board, player, opp_moves, my_moves):
+        if len(my_moves) == 0:
+            return []
+        move = my_moves[0]
+        return [('P', move[0], move[1])]
+
+
+class PathEvaluation:
+
+    """Score of the difference between the path lengths of the players.
+
+    Only the leaves reached by a move of the root player are scored, the
+    others count as even.
+    """
+
+    def evaluate(self, board, player, root_player):
+        if 1 - player != root_player:
+            return 0
+        player_steps = board.min_steps_before_victory_safe(root_player)
+        oppo_steps = board.min_steps_before_victory_safe(1 - root_player)
+        return oppo_steps - player_steps
+
+    def encode(self, board, player, root_player):
+        """Return the leaf as read by evaluate_batch(), None if it is not
+        scored.
+        """
+        if 1 - player != root_player:
+            return None
+        return encode(board), root_player
+
+    def evaluate_batch(self, items):
+        """Return the scores of the leaves of items, their paths searched
+        all at once by pawn_steps().
+        """
+        boards = [item[0] for item in items if item is not None]
+        steps = iter(pawn_steps(boards))
+        scores = []
+        for item in items:
+            if item is None:
+                scores.append(0)
+            else:
+                root_player = item[1]
+                pair = next(steps)
+                scores.append(pair[1 - root_player] - pair[root_player])
+        return scores
+
+
+class RolloutEvaluation:
+
+    """Score of a simulated game from the leaf, see rollout()."""
+
+    def __init__(self, depth=None, wall_prob=0.2):
+        """
+        Arguments:
+        depth -- maximum number of moves of a simulated game, None to play
+            it to the end
+        wall_prob -- probability that a simulated player places a wall
+        """
+        self.depth = depth
+        self.wall_prob = wall_prob
+
+    def evaluate(self, board, player, root_player):
+        score = rollout(board, player, self.depth, self.wall_prob)
+        return score if player == root_player else -score
@@ -0,0 +1,453 @@
+"""
+Monte Carlo tree search over a NodeStore.
+
+A single board walks down the tree and back up at each iteration: the
+actions of the edges are played on the way down and undone once the score
+of the leaf is backed up. The proven pawn races are scored exactly, see
+endgame.py; the other leaves are scored by the evaluation policy.
+
+With transpositions, the positions reached by several paths share one node,
+found by the Zobrist hash of the board, and the search walks a graph: the
+children already on the path of an iteration are excluded since they would
+close a cycle. Otherwise every path gets its own nodes.
+
+In batch mode, the leaves are evaluated batch_size at a time: the search
+walks down to batch_size leaves, each path taking a virtual loss so that
+the next walks spread to other children, then scores the leaves together
+with the evaluate_batch() of the evaluation policy and backs them up.
+
+With several threads, the workers run the iterations on one shared tree,
+each on its own copy of the board. Where the GIL is enabled, the threads
+would not run Python code at the same time anyway: the workers take turns,
+one whole iteration each, and the search gives the same results as with a
+single thread. On a free-threaded build, the workers only take the lock of
+the tree to add nodes and edges; the visits and scores are updated under
+one of NODE_LOCKS locks chosen by node id, and the paths take a virtual
+loss until their leaf is scored, as in batch mode.
+"""
+
+import random
+import sys
+import threading
+
+from quoridor import SIZE
+from node_store import NodeStore, NO_NODE, ROOT, encode_action, decode_action
+from time_manager import TimeManager
+from endgame import RACE_BUILDS, solve_race
+from mcts.policies import UCB1, CandidateExpansion, PathEvaluation
+
+# Number of locks of the visits and scores of a threaded search
+NODE_LOCKS = 64
+
+
+def gil_enabled():
+    """Return whether the GIL is enabled in this interpreter."""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is None or is_gil_enabled()
+
+
+class MCTS:
+
+    """Search of the best action of a position, configured by policies.
+
+    The tree of the last search is kept, and the part of it below the next
+    position of the agent is reused by the next search.
+    """
+
+    def __init__(self, selection=None, expansion=None, evaluation=None,
+                 timer=None, transpositions=False, batch_size=1,
+                 virtual_loss=1.0, threads=1):
+        """
+        Arguments:
+        selection -- selection policy (default: UCB1)
+        expansion -- expansion policy (default: CandidateExpansion)
+        evaluation -- evaluation policy (default: PathEvaluation)
+        timer -- time policy (default: a TimeManager)
+        transpositions -- whether the positions reached by several paths
+            share one node
+        batch_size -- number of leaves evaluated at once, see
+            evaluate_batch() in mcts/policies.py
+        virtual_loss -- score taken from the nodes of a path until its
+            leaf is scored, in batch mode and with threads
+        threads -- number of threads searching the tree
+        """
+        if batch_size > 1 and threads > 1:
+            raise ValueError("batches cannot be searched by threads")
+        if batch_size > 1 and evaluation is not None and \
+                not hasattr(evaluation, 'evaluate_batch'):
+            raise ValueError("the evaluation policy cannot score batches")
+        self.selection_policy = selection or UCB1()
+        self.expansion_policy = expansion or CandidateExpansion()
+        self.evaluation = evaluation or PathEvaluation()
+        self.timer = timer or TimeManager()
+        self.transpositions = transpositions
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.threads = threads
+        # Lock of the changes of the tree, lock of the turns of the
+        # threads and locks of the statistics of the nodes
+        self.lock = threading.Lock()
+        self.turn = threading.Lock()
+        self.node_locks = [threading.Lock() for _ in range(NODE_LOCKS)]
+        self.started = 0
+        self.player = None
+        self.race_builds = 0
+        # Statistics of the last search
+        self.iterations = 0
+        self.created_nodes = 0
+        self.shared_nodes = 0
+        self.reset()
+
+    def reset(self):
+        """Drops the tree of the last search."""
+        # Tree of the last search, its board and its node table
+        self.tree = None
+        self.root_board = None
+        self.table = None
+
+    def search(self, board, player, time_left=None, limit=None):
+        """Searches board for player and returns the action of the most
+        visited child of the root. The search runs until the time policy
+        stops it, or for limit iterations if limit is given. board is kept
+        for the next search and must not be modified.
+        """
+        self.player = player
+        self.created_nodes = 0
+        self.shared_nodes = 0
+        if not self.reuse_subtree(board, player):
+            self.tree = NodeStore()
+            self.tree.add_node(player)
+            self.table = {board.hash: ROOT} if self.transpositions else None
+            self.created_nodes = 1
+        tree = self.tree
+        self.timer.start(board, player, time_left)
+        self.race_builds = RACE_BUILDS
+        iterations = 0
+
+        def child_visits():
+            return tree.child_visits(ROOT)
+
+        if self.threads > 1:
+            iterations = self.run_threads(board, limit)
+        # The time policy is asked at every iteration, even while the root
+        # has no child, so that a root that cannot be expanded does not
+        # hang the search
+        while self.threads == 1 and \
+                not self.timer.should_stop(iterations, child_visits) and \
+                (iterations != limit or not tree.has_child(ROOT)):
+            if self.batch_size > 1:
+                count = self.batch_size
+                if limit is not None:
+                    count = min(count, limit - iterations)
+                self.batch(board, count)
+                iterations += count
+                continue
+            self.iteration(board)
+            iterations += 1
+
+        self.iterations = iterations
+        self.root_board = board
+        if not tree.has_child(ROOT):
+            # No action of the expansion policy was legal: play a pawn move
+            return board.get_legal_pawn_moves(player)[0]
+        return decode_action(tree.action[tree.most_visited_edge(ROOT)])
+
+    def reuse_subtree(self, board, player):
+        """Makes the node of the last search whose position is board, usually
+        a grandchild of the last root, the root of the tree and keeps only the
+        nodes it leads to. Returns False if there is no such node.
+        """
+        tree, table, previous = self.tree, self.table, self.root_board
+        self.reset()
+        if tree is None:
+            return False
+        if table is not None:
+            node = table.get(board.hash)
+        else:
+            node = self.find_grandchild(tree, previous, board)
+        if node is None or tree.player[node] != player:
+            return False
+        self.tree, ids = tree.extract(node)
+        if table is not None:
+            self.table = {key: ids[old] for key, old in table.items()
+                          if old in ids}
+        return True
+
+    @staticmethod
+    def find_grandchild(tree, previous, board):
+        """Returns the grandchild of the root of tree whose position is
+        board, previous being the position of the root, or None.
+        """
+        for edge in tree.edge_range(ROOT):
+            child = tree.child[edge]
+            if child == NO_NODE:
+                continue
+            token = previous.play_action_with_no_check(
+                decode_action(tree.action[edge]), tree.player[ROOT])
+            try:
+                for edge_ in tree.edge_range(child):
+                    grandchild = tree.child[edge_]
+                    if grandchild == NO_NODE:
+                        continue
+                    token_ = previous.play_action_with_no_check(
+                        decode_action(tree.action[edge_]), tree.player[child])
+                    found = previous.hash == board.hash
+                    previous.undo_action(token_)
+                    if found:
+                        return grandchild
+            finally:
+                previous.undo_action(token)
+        return None
+
+    def iteration(self, board):
+        """Runs one iteration of the search on board."""
+        tokens = []
+        path = [ROOT]
+        leaf = self.selection(board, tokens, path)
+        child = self.expansion(leaf, board, tokens, path)
+        score = self.simulation(child, board)
+        self.backpropagate(score, path)
+        for token in reversed(tokens):
+            board.undo_action(token)
+
+    def run_threads(self, board, limit):
+        """Runs the iterations of the search in threads workers, each on a
+        copy of board, and returns the number of iterations run.
+        """
+        self.started = 0
+        errors = []
+        worker = self.take_turns if gil_enabled() else self.run_concurrently
+
+        def run(board):
+            try:
+                worker(board, limit)
+            except BaseException as e:
+                errors.append(e)
+
+        workers = [threading.Thread(target=run, args=(board.clone(),))
+                   for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return self.started
+
+    def claim_iteration(self, limit):
+        """Counts one more iteration and returns True, or returns False if
+        the search must stop. Called with the turn lock held.
+        """
+        tree = self.tree
+        if self.timer.should_stop(self.started,
+                                  lambda: tree.child_visits(ROOT)) or \
+                (self.started == limit and tree.has_child(ROOT)):
+            return False
+        self.started += 1
+        return True
+
+    def take_turns(self, board, limit):
+        """Runs whole iterations on board, one thread at a time."""
+        while True:
+            with self.turn:
+                if not self.claim_iteration(limit):
+                    return
+                self.iteration(board)
+
+    def run_concurrently(self, board, limit):
+        """Runs iterations on board alongside the other threads."""
+        tree = self.tree
+        virtual_loss = self.virtual_loss
+        while True:
+            with self.turn:
+                if not self.claim_iteration(limit):
+                    return
+            tokens = []
+            path = [ROOT]
+            leaf = self.selection(board, tokens, path)
+            child = self.expansion(leaf, board, tokens, path)
+            self.update_nodes(path, 1, -virtual_loss)
+            score = self.proven_score(child, board)
+            if score is None:
+                score = self.evaluation.evaluate(board, tree.player[child],
+                                                 self.player)
+            for token in reversed(tokens):
+                board.undo_action(token)
+            self.update_nodes(path, 0, score + virtual_loss)
+
+    def update_nodes(self, path, visits, score):
+        """Adds visits and score to the nodes of path, each under its
+        lock.
+        """
+        tree = self.tree
+        locks = self.node_locks
+        for node in path:
+            with locks[node % NODE_LOCKS]:
+                tree.visit[node] += visits
+                tree.score[node] += score
+
+    def selection(self, board, tokens, path):
+        tree = self.tree
+        # Children already on the path would close a cycle
+        exclude = path if self.transpositions else ()
+        node = ROOT
+        while tree.has_child(node):
+            selected = self.selection_policy.select(tree, node, exclude)
+            if selected is None:
+                break
+
+            child = self.play_edge(node, selected, board, tokens, path)
+            if child is not None:
+                node = child
+
+        return node
+
+    def expansion(self, node, board, tokens, path):
+        tree = self.tree
+        if tree.visit[node] == 0:
+            return node
+
+        if board.is_finished() or tree.winner(node) is not None:
+            return node
+
+        if not tree.has_child(node):
+            # The pawn move and the unchecked walls are checked when first
+            # played
+            actions, unchecked = self.expansion_policy.actions(
+                board, tree.player[node])
+            with self.lock:
+                # Another thread may have expanded node meanwhile
+                if not tree.has_child(node):
+                    tree.add_edges(node, [encode_action(action)
+                                          for action in actions], unchecked)
+
+        while True:
+            candidates = tree.edge_range(node)
+            if self.transpositions:
+                candidates = [edge for edge in candidates
+                              if tree.child[edge] not in path]
+            if len(candidates) == 0:
+                return node
+
+            child = self.play_edge(node, random.choice(candidates), board,
+                                   tokens, path)
+            if child is not None:
+                return child
+
+    def play_edge(self, node, edge, board, tokens, path):
+        """Plays the action of edge on board and returns the child it leads
+        to, or None if the action is invalid or the child is on the path.
+
+        The child is added the first time the edge is played, unless the
+        table holds a node of the same position.
+        """
+        tree = self.tree
+        if tree.child[edge] == NO_NODE:
+            # The first play of an edge changes the tree
+            with self.lock:
+                return self.first_play(node, edge, board, tokens, path)
+        token = tree.play(node, edge, board)
+        if token is None:
+            # The edge was replaced by another thread meanwhile
+            return None
+        tokens.append(token)
+        path.append(tree.child[edge])
+        return tree.child[edge]
+
+    def first_play(self, node, edge, board, tokens, path):
+        tree, table = self.tree, self.table
+        token = tree.play(node, edge, board)
+        if token is None:
+            return None
+        child = tree.child[edge]
+        if child == NO_NODE:
+            child = table.get(board.hash) if table is not None else None
+            if child is None:
+                child = tree.add_node(1 - tree.player[node], node)
+                if table is not None:
+                    table[board.hash] = child
+                self.created_nodes += 1
+                tree.child[edge] = child
+            else:
+                self.shared_nodes += 1
+                tree.child[edge] = child
+                if child in path:
+                    # select_edge() excludes it from now on
+                    board.undo_action(token)
+                    return None
+        tokens.append(token)
+        path.append(child)
+        return child
+
+    def batch(self, board, count):
+        """Runs count iterations whose leaves are evaluated together."""
+        tree = self.tree
+        virtual_loss = self.virtual_loss
+        paths = []
+        scores = []
+        items = []
+        for _ in range(count):
+            tokens = []
+            path = [ROOT]
+            leaf = self.selection(board, tokens, path)
+            child = self.expansion(leaf, board, tokens, path)
+            # The visits are counted now, the scores once they are known
+            for node in path:
+                tree.visit[node] += 1
+                tree.score[node] -= virtual_loss
+            score = self.proven_score(child, board)
+            if score is None:
+                items.append(self.evaluation.encode(board, tree.player[child],
+                                                    self.player))
+            for token in reversed(tokens):
+                board.undo_action(token)
+            paths.append(path)
+            scores.append(score)
+        evaluated = iter(self.evaluation.evaluate_batch(items))
+        for path, score in zip(paths, scores):
+            if score is None:
+                score = next(evaluated)
+            for node in path:
+                tree.score[node] += score + virtual_loss
+
+    def simulation(self, node, board):
+        tree = self.tree
+        tree.visit[node] += 1
+
+        score = self.proven_score(node, board)
+        if score is None:
+            score = self.evaluation.evaluate(board, tree.player[node],
+                                             self.player)
+
+        tree.score[node] += score
+        return score
+
+    def proven_score(self, node, board):
+        """Returns the score of node if it is a proven race, None otherwise.
+        The races are only solved at the first visit of node.
+        """
+        tree = self.tree
+        winner = tree.winner(node)
+        if winner is None and tree.visit[node] == 1:
+            winner = self.solve_race(node, board)
+        if winner is None:
+            return None
+        # A proven race counts as a lead of a whole board
+        return SIZE if winner == self.player else -SIZE
+
+    def solve_race(self, node, board):
+        """Marks node as proven if board is a pawn race with a winner, and
+        returns the winner or None.
+        """
+        winner, _, self.race_builds = solve_race(
+            board, self.tree.player[node], self.race_builds)
+        if winner is not None:
+            self.tree.set_winner(node, winner)
+        return winner
+
+    def backpropagate(self, score, path):
+        # The leaf was updated by the simulation
+        tree = self.tree
+        for node in path[:-1]:
+            tree.score[node] += score
+            tree.visit[node] += 1
@@ -0,0 +1,286 @@
+"""
+Compact storage of the Monte Carlo search trees.
+
+The nodes of a search are not Python objects but ids indexing preallocated
+arrays, one array per field. A node holds its visit count, its score, its
+parent, the player to play, its proven winner if any and the range of its
+outgoing edges. An edge holds
+the child it leads to and the encoded action played there, so that a node
+reached by several paths (a transposition) can be the child of several nodes.
+
+No board is kept in the store: the searches play the actions of the edges on
+a single board on the way down and undo them on the way up. The actions are
+only checked the first time they are played, see NodeStore.play(), and the
+walls known to be legal when the edges are added not at all.
+"""
+
+from array import array
+import math
+import random
+
+SIZE = 9
+
+# Every action as encoded in the store: kind * 81 + x * 9 + y
+ACTION_KINDS = ('P', 'WH', 'WV')
+ACTIONS = [(kind, x, y) for kind in ACTION_KINDS
+           for x in range(SIZE) for y in range(SIZE)]
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+NO_NODE = -1
+# The root of a search is the first node of its store
+ROOT = 0
+# UCB1 value of the children excluded from a selection
+EXCLUDED = -math.inf
+
+
+def encode_action(action):
+    """Return the code of action in the store."""
+    return ACTION_CODES[tuple(action)]
+
+
+def decode_action(code):
+    """Return the action of code, a tuple (kind, x, y)."""
+    return ACTIONS[code]
+
+
+class NodeStore:
+
+    """Search tree stored as parallel arrays indexed by node id.
+
+    Nodes and edges are appended to buffers whose capacity doubles when they
+    are full. The edges of a node are added all at once by add_edges(), so
+    they are the contiguous edges first[node] .. first[node]+count[node]-1.
+    The child of an edge is NO_NODE until the edge is first played.
+    """
+
+    def __init__(self, capacity=1024, edge_capacity=None):
+        """
+        Arguments:
+        capacity -- number of nodes preallocated
+        edge_capacity -- number of edges preallocated (default: 8 per node)
+        """
+        self.size = 0
+        self.edges = 0
+        self.capacity = 0
+        self.edge_capacity = 0
+        # Node fields
+        self.visit = array('i')
+        self.score = array('d')
+        self.parent = array('i')
+        self.player = array('b')
+        self.proven = array('b')
+        self.unchecked = array('H')
+        self.first = array('i')
+        self.count = array('H')
+        # Edge fields
+        self.child = array('i')
+        self.action = array('H')
+        self._grow_nodes(capacity)
+        self._grow_edges(edge_capacity or 8 * capacity)
+
+    def _grow_nodes(self, capacity):
+        extra = capacity - self.capacity
+        for buffer in (self.visit, self.score, self.parent, self.player,
+                       self.proven, self.unchecked, self.first, self.count):
+            buffer.frombytes(bytes(extra * buffer.itemsize))
+        self.capacity = capacity
+
+    def _grow_edges(self, capacity):
+        extra = capacity - self.edge_capacity
+        for buffer in (self.child, self.action):
+            buffer.frombytes(bytes(extra * buffer.itemsize))
+        self.edge_capacity = capacity
+
+    def nbytes(self, used=False):
+        """Return the number of bytes of the buffers, or of the part of them
+        holding nodes and edges if used.
+        """
+        nodes = self.size if used else self.capacity
+        edges = self.edges if used else self.edge_capacity
+        node_size = sum(buffer.itemsize for buffer in (
+            self.visit, self.score, self.parent, self.player, self.proven,
+            self.unchecked, self.first, self.count))
+        edge_size = self.child.itemsize + self.action.itemsize
+        return nodes * node_size + edges * edge_size
+
+    def add_node(self, player, parent=NO_NODE):
+        """Add a node without children and return its id."""
+        node = self.size
+        if node == self.capacity:
+            self._grow_nodes(2 * self.capacity)
+        self.visit[node] = 0
+        self.score[node] = 0
+        self.parent[node] = parent
+        self.player[node] = player
+        self.proven[node] = 0
+        self.unchecked[node] = 0
+        self.first[node] = 0
+        self.count[node] = 0
+        self.size = node + 1
+        return node
+
+    def add_edges(self, node, codes, unchecked=None):
+        """Give node one edge for each action of codes. A node gets its edges
+        once, and their children are only added when they are first played.
+        Only the walls of the first unchecked codes (all of them if None)
+        may be illegal, the others are known to be legal.
+        """
+        first = self.edges
+        end = first + len(codes)
+        if end > self.edge_capacity:
+            self._grow_edges(max(end, 2 * self.edge_capacity))
+        self.child[first:end] = array('i', [NO_NODE]) * len(codes)
+        self.action[first:end] = array('H', codes)
+        self.first[node] = first
+        self.count[node] = len(codes)
+        if unchecked is None:
+            unchecked = len(codes)
+        self.unchecked[node] = unchecked
+        self.edges = end
+
+    def remove_edge(self, node, edge):
+        """Remove edge from the edges of node, replacing it by the last one."""
+        last = self.first[node] + self.count[node] - 1
+        self.child[edge] = self.child[last]
+        self.action[edge] = self.action[last]
+        self.count[node] -= 1
+
+    def play(self, node, edge, board):
+        """Play the action of edge on board and return the undo token.
+
+        The edges are added with candidate actions, which are only checked
+        the first time they are played, i.e. while their child is NO_NODE,
+        except the walls known to be legal, after the first unchecked edges.
+        An edge removed is replaced by the last one, which then gets checked
+        as well.
+        If the action turns out to be invalid, the edge is removed and None
+        is returned. Otherwise the caller sets the child of the edge.
+        """
+        action = decode_action(self.action[edge])
+        player = self.player[node]
+        if self.child[edge] == NO_NODE and \
+                (action[0] == 'P' or
+                 edge - self.first[node] < self.unchecked[node]) and \
+                not board.is_action_valid(action, player):
+            self.remove_edge(node, edge)
+            return None
+        return board.play_action_with_no_check(action, player)
+
+    def set_winner(self, node, winner):
+        """Record that the game is won by winner from node."""
+        self.proven[node] = winner + 1
+
+    def winner(self, node):
+        """Return the proven winner from node, or None if it is unknown."""
+        proven = self.proven[node]
+        return proven - 1 if proven else None
+
+    def edge_range(self, node):
+        """Return the range of the edges of node."""
+        first = self.first[node]
+        return range(first, first + self.count[node])
+
+    def has_child(self, node):
+        return self.count[node] > 0
+
+    def child_visits(self, node):
+        """Return the visit counts of the children of node."""
+        visit, child = self.visit, self.child
+        return [visit[child[edge]] if child[edge] != NO_NODE else 0
+                for edge in self.edge_range(node)]
+
+    def select_edge(self, node, exclude=()):
+        """Return the edge of node leading to the child of highest UCB1
+        value, skipping the children in exclude and breaking ties at random.
+        Return None if node has no child left.
+
+        The values of all the children are computed in one pass over their
+        statistics, and the logarithm of the visits of node only once.
+        """
+        first = self.first[node]
+        children = self.child[first:first + self.count[node]]
+        visit = self.visit
+        visits = [visit[child] if child != NO_NODE else 0
+                  for child in children]
+        if exclude:
+            for i, child in enumerate(children):
+                if child in exclude:
+                    visits[i] = EXCLUDED
+        if 0 in visits:
+            # The children never visited have the highest value
+            ties = [i for i, v in enumerate(visits) if v == 0]
+        else:
+            score, sqrt = self.score, math.sqrt
+            parent_visit = visit[node]
+            # sqrt(2) * sqrt(log(n) / v) is sqrt(2 * log(n) / v)
+            log_visit = 2 * math.log(parent_visit) if parent_visit else 0
+            values = [score[child] / v + sqrt(log_visit / v) if v > 0
+                      else EXCLUDED for child, v in zip(children, visits)]
+            if not values:
+                return None
+            best = max(values)
+            if best == EXCLUDED:
+                return None
+            if values.count(best) == 1:
+                return first + values.index(best)
+            ties = [i for i, value in enumerate(values) if value == best]
+        return first + random.choice(ties)
+
+    def most_visited_edge(self, node):
+        """Return the edge of node leading to its most visited child, or
+        None if no child was visited.
+        """
+        max_v = 0
+        most_visited = None
+        for edge in self.edge_range(node):
+            if self.child[edge] == NO_NODE:
+                continue
+            visit = self.visit[self.child[edge]]
+            if visit > max_v:
+                max_v = visit
+                most_visited = edge
+        return most_visited
+
+    def statistics(self, node):
+        """Return the list of (action, visit, score) of the children of node
+        that were played.
+        """
+        statistics = []
+        for edge in self.edge_range(node):
+            child = self.child[edge]
+            if child != NO_NODE:
+                statistics.append((decode_action(self.action[edge]),
+                                   self.visit[child], self.score[child]))
+        return statistics
+
+    def extract(self, root):
+        """Return a new store holding the nodes reachable from root, and the
+        dictionary mapping their ids in this store to their ids in the new
+        one. root becomes ROOT and has no parent; the other parents that
+        were not kept are dropped as well.
+        """
+        order = [root]
+        ids = {root: ROOT, NO_NODE: NO_NODE}
+        for node in order:
+            for edge in self.edge_range(node):
+                child = self.child[edge]
+                if child not in ids:
+                    ids[child] = len(order)
+                    order.append(child)
+        store = NodeStore(max(1024, len(order)))
+        for node in order:
+            store.add_node(self.player[node], ids.get(self.parent[node],
+                                                      NO_NODE))
+            store.visit[ids[node]] = self.visit[node]
+            store.score[ids[node]] = self.score[node]
+            store.proven[ids[node]] = self.proven[node]
+        store.parent[ROOT] = NO_NODE
+        for node in order:
+            edges = self.edge_range(node)
+            if edges:
+                store.add_edges(ids[node],
+                                self.action[edges.start:edges.stop],
+                                self.unchecked[node])
+                store.child[store.first[ids[node]]:store.edges] = array(
+                    'i', [ids[self.child[edge]] for edge in edges])
+        del ids[NO_NODE]
+        return store, ids
@@ -26,6 +26,192 @@ PLAYER2 = 1
 
 import heapq
 
+# Bit layout used by BitBoard. Cell (row, col) is bit row * 9 + col of an
+# 81-bit integer, wall slot (x, y) is bit x * 8 + y of a 64-bit integer.
+# blocked_down has the bit of a cell set when the edge towards the cell
+# below it is closed, blocked_right likewise for the cell on its right. The
+# last row and column are always closed so that shifts never wrap around.
+SIZE = 9
+WALL_SIZE = SIZE - 1
+ALL_CELLS = (1 << (SIZE * SIZE)) - 1
+LAST_ROW = sum(1 << ((SIZE - 1) * SIZE + c) for c in range(SIZE))
+LAST_COL = sum(1 << (r * SIZE + SIZE - 1) for r in range(SIZE))
+ROW_MASKS = [sum(1 << (r * SIZE + c) for c in range(SIZE))
+             for r in range(SIZE)]
+
+# Edges closed by the wall in slot x * 8 + y.
+HORIZ_WALL_EDGES = [(1 << (x * SIZE + y)) | (1 << (x * SIZE + y + 1))
+                    for x in range(WALL_SIZE) for y in range(WALL_SIZE)]
+VERTI_WALL_EDGES = [(1 << (x * SIZE + y)) | (1 << ((x + 1) * SIZE + y))
+                    for x in range(WALL_SIZE) for y in range(WALL_SIZE)]
+
+
+def _wall_bit(x, y):
+    """Return the bit of wall slot (x, y), 0 if outside the board."""
+    if 0 <= x < WALL_SIZE and 0 <= y < WALL_SIZE:
+        return 1 << (x * WALL_SIZE + y)
+    return 0
+
+
+# Slots of the same orientation that overlap a wall in slot x * 8 + y.
+HORIZ_WALL_CONFLICTS = [_wall_bit(x, y - 1) | _wall_bit(x, y + 1)
+                        for x in range(WALL_SIZE) for y in range(WALL_SIZE)]
+VERTI_WALL_CONFLICTS = [_wall_bit(x - 1, y) | _wall_bit(x + 1, y)
+                        for x in range(WALL_SIZE) for y in range(WALL_SIZE)]
+
+
+def wall_masks(horiz_walls, verti_walls):
+    """Return the tuple (horiz_mask, verti_mask, blocked_down,
+    blocked_right) encoding the given wall lists.
+    """
+    horiz_mask = verti_mask = 0
+    blocked_down = LAST_ROW
+    blocked_right = LAST_COL
+    for (x, y) in horiz_walls:
+        k = x * WALL_SIZE + y
+        horiz_mask |= 1 << k
+        blocked_down |= HORIZ_WALL_EDGES[k]
+    for (x, y) in verti_walls:
+        k = x * WALL_SIZE + y
+        verti_mask |= 1 << k
+        blocked_right |= VERTI_WALL_EDGES[k]
+    return horiz_mask, verti_mask, blocked_down, blocked_right
+
+
+# Zobrist keys of Board.hash. They come from a fixed seed so that the hash
+# of a position is the same in every process.
+_zobrist_random = random.Random(8215)
+ZOBRIST_PAWNS = [[_zobrist_random.getrandbits(64) for _ in range(SIZE * SIZE)]
+                 for player in (PLAYER1, PLAYER2)]
+ZOBRIST_HORIZ_WALLS = [_zobrist_random.getrandbits(64)
+                       for _ in range(WALL_SIZE * WALL_SIZE)]
+ZOBRIST_VERTI_WALLS = [_zobrist_random.getrandbits(64)
+                       for _ in range(WALL_SIZE * WALL_SIZE)]
+ZOBRIST_WALLS_LEFT = [[_zobrist_random.getrandbits(64) for _ in range(64)]
+                      for player in (PLAYER1, PLAYER2)]
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+
+
+def flood_step(frontier, blocked_down, blocked_right):
+    """Return the cells next to a cell of frontier that no wall separates
+    from it. The masks close the edges leaving the last row and column, so
+    that they may also hold several boards side by side, as in
+    batch_paths.py.
+    """
+    return (((frontier & ~blocked_down) << SIZE) |
+            ((frontier >> SIZE) & ~blocked_down) |
+            ((frontier & ~blocked_right) << 1) |
+            ((frontier >> 1) & ~blocked_right))
+
+
+def flood_fill(cells, blocked_down, blocked_right, target=0, free=ALL_CELLS):
+    """Return the set of cells reachable from cells through open edges.
+
+    All the cells of a mask move in the four directions at once, so each
+    iteration extends every path by one step. Only cells in free can be
+    entered and the search stops as soon as a cell of target is reached.
+    """
+    seen = cells
+    frontier = cells
+    while frontier and not seen & target:
+        frontier = flood_step(frontier, blocked_down, blocked_right) & \
+            free & ~seen
+        seen |= frontier
+    return seen
+
+
+def flood_path_exists(cell, other, goal_row, blocked_down, blocked_right):
+    """Decide with flood fills whether the pawn on cell can reach goal_row
+    when the edges in the masks are closed, the opponent pawn standing on
+    other. Return None when all the paths go through the opponent pawn,
+    which only the exact search can decide because of the jump rules.
+    """
+    start = 1 << cell
+    goal = ROW_MASKS[goal_row]
+    if start & goal:
+        return True
+    free = ALL_CELLS & ~(1 << other)
+    if flood_fill(start, blocked_down, blocked_right, goal, free) & goal:
+        return True
+    if not flood_fill(start, blocked_down, blocked_right, goal) & goal:
+        return False
+    return None
+
+
+def cell_neighbours(cell, blocked_down, blocked_right):
+    """Return the cells next to cell that no wall separates from it. The
+    masks close the edges leaving the last row and column.
+    """
+    cells = []
+    if not (blocked_down >> cell) & 1:
+        cells.append(cell + SIZE)
+    if cell >= SIZE and not (blocked_down >> (cell - SIZE)) & 1:
+        cells.append(cell - SIZE)
+    if not (blocked_right >> cell) & 1:
+        cells.append(cell + 1)
+    if cell % SIZE and not (blocked_right >> (cell - 1)) & 1:
+        cells.append(cell - 1)
+    return cells
+
+
+def pawn_targets(cell, other, neighbours):
+    """Return the cells a pawn in cell can move to when the other pawn is
+    in other, neighbours(c) giving the cells of cell_neighbours() of c.
+    """
+    moves = []
+    for target in neighbours(cell):
+        if target != other:
+            moves.append(target)
+            continue
+        # Jump over the other pawn, or aside when a wall stands behind it
+        beyond = neighbours(other)
+        straight = 2 * other - cell
+        if straight in beyond:
+            moves.append(straight)
+        else:
+            moves.extend(c for c in beyond if c != cell)
+    return moves
+
+
+# Distance given to the cells from which the goal row cannot be reached.
+UNREACHABLE = SIZE * SIZE
+
+
+def distance_layers(goal_row, blocked_down, blocked_right):
+    """Return the list of masks of the cells at distance 0, 1, 2, ... from
+    goal_row, ignoring the pawns, by a breadth-first search from the goal
+    row.
+    """
+    layers = [ROW_MASKS[goal_row]]
+    seen = frontier = layers[0]
+    while True:
+        frontier = flood_step(frontier, blocked_down, blocked_right) & ~seen
+        if not frontier:
+            return layers
+        seen |= frontier
+        layers.append(frontier)
+
+
+def _set_distances(dist, layers, first):
+    """Write in dist the distances of the cells in layers[first:]."""
+    for d in range(first, len(layers)):
+        cells = layers[d]
+        while cells:
+            low = cells & -cells
+            dist[low.bit_length() - 1] = d
+            cells ^= low
+
+
+def goal_distances(goal_row, blocked_down, blocked_right):
+    """Return the list giving for each cell the number of moves needed to
+    reach goal_row, ignoring the pawns (see distance_layers()).
+    """
+    dist = [UNREACHABLE] * (SIZE * SIZE)
+    _set_distances(dist,
+                   distance_layers(goal_row, blocked_down, blocked_right), 0)
+    return dist
+
+
 class InvalidAction(Exception):
 
     """Raised when an invalid action is played."""
@@ -67,6 +253,9 @@ class Board:
         self.nb_walls = [self.starting_walls, self.starting_walls]
         self.horiz_walls = []
         self.verti_walls = []
+        # (goal, blocked_down, blocked_right, distances, layers) for each
+        # player, see get_goal_distances()
+        self._goal_distances = [None, None]
 
         if percepts is not None:
             self.pawns[0] = percepts['pawns'][0]
@@ -79,6 +268,25 @@ class Board:
                 self.verti_walls.append((x, y))
             self.nb_walls[0] = percepts['nb_walls'][0]
             self.nb_walls[1] = percepts['nb_walls'][1]
+        # Zobrist hash of the position, see compute_hash()
+        self.hash = self.compute_hash()
+
+    def compute_hash(self):
+        """Returns the 64-bit Zobrist hash of the pawns, the walls and the
+        walls left. The side to move is the parity of the actions played
+        on this board: each one flips ZOBRIST_SIDE in self.hash, which
+        play_action(), move_pawn() and add_wall() keep up to date.
+        """
+        value = 0
+        for player in (PLAYER1, PLAYER2):
+            (x, y) = self.pawns[player]
+            value ^= ZOBRIST_PAWNS[player][x * SIZE + y]
+            value ^= ZOBRIST_WALLS_LEFT[player][self.nb_walls[player]]
+        for (x, y) in self.horiz_walls:
+            value ^= ZOBRIST_HORIZ_WALLS[x * WALL_SIZE + y]
+        for (x, y) in self.verti_walls:
+            value ^= ZOBRIST_VERTI_WALLS[x * WALL_SIZE + y]
+        return value
 
     def pretty_print(self):
         """print of the representation"""
@@ -135,8 +343,26 @@ class Board:
             clone_board.horiz_walls.append((x, y))
         for (x, y) in self.verti_walls:
             clone_board.verti_walls.append((x, y))
+        clone_board._goal_distances = list(self._goal_distances)
+        clone_board.hash = self.hash
         return clone_board
 
+    def get_percepts(self):
+        """Returns the board encoded as a dictionary that can be fed to
+        dict_to_board() or sent to a remote agent.
+        """
+        return {
+            'size': self.size,
+            'rows': self.rows,
+            'cols': self.cols,
+            'starting_walls': self.starting_walls,
+            'pawns': [tuple(pawn) for pawn in self.pawns],
+            'goals': list(self.goals),
+            'nb_walls': list(self.nb_walls),
+            'horiz_walls': [tuple(wall) for wall in self.horiz_walls],
+            'verti_walls': [tuple(wall) for wall in self.verti_walls],
+        }
+
     def can_move_here(self, i, j, player):
         """Returns true if the player can move to (i, j),
         false otherwise
@@ -210,18 +436,59 @@ class Board:
             return True
         return self.is_simplified_pawn_move_ok(former_pos, new_pos)
 
-    def paths_exist(self):
-        """Returns True if there exists a path from both players to
-        at least one of their respective goals; False otherwise.
+    def get_masks(self):
+        """Returns the tuple (horiz_mask, verti_mask, blocked_down,
+        blocked_right) describing the walls, see wall_masks().
+        """
+        return wall_masks(self.horiz_walls, self.verti_walls)
+
+    def _flood_path_exists(self, player, blocked_down, blocked_right):
+        """Decides with flood fills whether player can reach its goal
+        when the edges in the masks are closed. Returns None when all the
+        paths go through the opponent pawn, which only the exact search
+        can decide because of the jump rules.
+        """
+        (x, y) = self.pawns[player]
+        (ox, oy) = self.pawns[(player + 1) % 2]
+        return flood_path_exists(x * SIZE + y, ox * SIZE + oy,
+                                 self.goals[player], blocked_down,
+                                 blocked_right)
+
+    def _paths_exist(self, blocked_down, blocked_right, wall=None):
+        """paths_exist() when the edges in the masks are closed.
+
+        wall is a (pos, is_horiz) pair already counted in the masks but not
+        on the board. It is placed temporarily if the exact search is needed.
         """
+        undecided = []
+        for player in (PLAYER1, PLAYER2):
+            found = self._flood_path_exists(player, blocked_down,
+                                            blocked_right)
+            if found is None:
+                undecided.append(player)
+            elif not found:
+                return False
+        if not undecided:
+            return True
+        if wall is not None:
+            self._push_wall(*wall)
         try:
-            self.min_steps_before_victory(0)
-            self.min_steps_before_victory(1)
+            for player in undecided:
+                self.get_shortest_path_astar(player)
             return True
         except NoPath:
             return False
+        finally:
+            if wall is not None:
+                self._pop_wall(*wall)
+
+    def paths_exist(self):
+        """Returns True if there exists a path from both players to
+        at least one of their respective goals; False otherwise.
+        """
+        _, _, blocked_down, blocked_right = self.get_masks()
+        return self._paths_exist(blocked_down, blocked_right)
 
-    
     def get_shortest_path_base(self, player):
         """ Returns a shortest path for player to reach its goal
         if player is on its goal, the shortest path is an empty list
@@ -269,7 +536,89 @@ class Board:
                     prede[x_][y_] = neighbor
         raise NoPath()
 
+    def get_goal_distances(self, player):
+        """Returns the list giving, for the cell (x, y) at index x * 9 + y,
+        the number of moves needed by player to reach its goal row from
+        there, ignoring the pawns. Cells cut from the goal are UNREACHABLE.
+
+        The list is cached with the walls it was computed for: pawn moves
+        keep it, adding walls computes it again. It must not be modified.
+        """
+        _, _, blocked_down, blocked_right = self.get_masks()
+        goal = self.goals[player]
+        cached = self._goal_distances[player]
+        if cached is not None and cached[:3] == \
+                (goal, blocked_down, blocked_right):
+            return cached[3]
+        layers = distance_layers(goal, blocked_down, blocked_right)
+        dist = [UNREACHABLE] * (SIZE * SIZE)
+        _set_distances(dist, layers, 0)
+        self._goal_distances[player] = \
+            (goal, blocked_down, blocked_right, dist, layers)
+        return dist
+
+    def get_distance_layers(self, player):
+        """Returns the list of distance_layers() from the goal row of
+        player, the masks of the cells at distance 0, 1, 2, ... computed
+        and cached with get_goal_distances(). It must not be modified.
+        """
+        self.get_goal_distances(player)
+        return self._goal_distances[player][4]
+
     def get_shortest_path(self, player):
+        """ Returns a path for player to reach its goal
+        if player is on its goal, the path is an empty list
+        if no path exists, exception is thrown. This version walks down
+        the map of get_goal_distances(), which ignores the opponent pawn:
+        the jumps over it are only considered when the pawns are adjacent,
+        so the path may be longer than the one of
+        get_shortest_path_astar() when a jump further on would shorten it.
+
+        Before the distance maps, this method was the A* search, which
+        returned a shortest path taking the opponent pawn into account.
+        Code relying on that must call get_shortest_path_astar().
+        """
+        dist = self.get_goal_distances(player)
+        _, _, blocked_down, blocked_right = self.get_masks()
+        (x, y) = self.pawns[player]
+        (x_op, y_op) = self.pawns[(player + 1) % 2]
+        cell = x * SIZE + y
+        d = dist[cell]
+        if d == UNREACHABLE:
+            raise NoPath()
+        path = []
+        while d:
+            (x, y) = divmod(cell, SIZE)
+            if abs(x - x_op) + abs(y - y_op) == 1:
+                # The opponent pawn is next to us, allow the jumps
+                best = cell
+                for (x_, y_) in [(x + 1, y), (x - 1, y), (x, y + 1),
+                                 (x, y - 1), (x + 1, y + 1), (x - 1, y - 1),
+                                 (x + 1, y - 1), (x - 1, y + 1), (x + 2, y),
+                                 (x - 2, y), (x, y + 2), (x, y - 2)]:
+                    if self.is_pawn_move_ok((x, y), (x_, y_), (x_op, y_op)) \
+                            and dist[x_ * SIZE + y_] < dist[best]:
+                        best = x_ * SIZE + y_
+                if dist[best] >= d:
+                    # Only the opponent pawn stands on the way down
+                    return self.get_shortest_path_astar(player)
+                cell = best
+            elif cell >= SIZE and dist[cell - SIZE] == d - 1 and \
+                    not (blocked_down >> (cell - SIZE)) & 1:
+                cell -= SIZE
+            elif cell + SIZE < SIZE * SIZE and dist[cell + SIZE] == d - 1 \
+                    and not (blocked_down >> cell) & 1:
+                cell += SIZE
+            elif y and dist[cell - 1] == d - 1 and \
+                    not (blocked_right >> (cell - 1)) & 1:
+                cell -= 1
+            else:
+                cell += 1
+            d = dist[cell]
+            path.append(divmod(cell, SIZE))
+        return path
+
+    def get_shortest_path_astar(self, player):
         """ Returns a shortest path for player to reach its goal
         if player is on its goal, the shortest path is an empty list
         if no path exists, exception is thrown. This version use the A* search
@@ -326,33 +675,50 @@ class Board:
 
     def min_steps_before_victory(self, player):
         """Returns the minimum number of pawn moves necessary for the
-        player to reach its goal raw.
+        player to reach its goal raw, ignoring the pawns (see
+        get_goal_distances()).
+
+        This is not the length of the path of the former A* search, which
+        went around the opponent pawn or jumped over it: the two differ by
+        one move in about a fifth of the positions. That length is still
+        given by len(get_shortest_path_astar(player)).
         """
-        return len(self.get_shortest_path(player))
+        (x, y) = self.pawns[player]
+        steps = self.get_goal_distances(player)[x * SIZE + y]
+        if steps == UNREACHABLE:
+            raise NoPath()
+        return steps
 
     def min_steps_before_victory_safe(self, player):
         """Returns the minimum number of pawn moves necessary for the
         player to reach its goal raw. Deal with the case where there
-        is no shortest past if the other player does not move.
+        is no shortest past if the other player does not move: the
+        distances ignore the pawns, so the opponent cannot hide the goal.
         Ref : https://inf8215-ia-a2021.slack.com/archives/C02FPE9D76K/p1634324106022600?thread_ts=1633832734.012800&cid=C02FPE9D76K
         """
-        try:
-            return len(self.get_shortest_path(player))
-        except NoPath:
-            print("No path exception")
-            print(self)
-            temp = self.pawns[1 - player]
-            self.pawns[1 - player] = self.pawns[player]
-            shortest_path_length = len(self.get_shortest_path(player))
-            self.pawns[1 - player] = temp
-            return shortest_path_length
+        return self.min_steps_before_victory(player)
+
+    def _hash_wall(self, pos, is_horiz, player):
+        """Updates the hash for a wall about to be placed by player.
+
+        Raises InvalidAction, the board left untouched, if player has no
+        wall left: ZOBRIST_WALLS_LEFT[player][-1] would silently corrupt
+        the hash.
+        """
+        k = pos[0] * WALL_SIZE + pos[1]
+        left = self.nb_walls[player]
+        if left <= 0:
+            raise InvalidAction(('WH' if is_horiz else 'WV',) + tuple(pos),
+                                player)
+        self.hash ^= (ZOBRIST_HORIZ_WALLS if is_horiz
+                      else ZOBRIST_VERTI_WALLS)[k] ^ \
+            ZOBRIST_WALLS_LEFT[player][left] ^ \
+            ZOBRIST_WALLS_LEFT[player][left - 1] ^ ZOBRIST_SIDE
 
     def add_wall_with_no_check(self, pos, is_horiz, player):
         """Equivalent to add_wall. Except path existence test is performed"""
-        if is_horiz:
-            self.horiz_walls.append(pos)
-        else:
-            self.verti_walls.append(pos)
+        self._hash_wall(pos, is_horiz, player)
+        self._push_wall(pos, is_horiz)
         self.nb_walls[player] -= 1
 
     def add_wall(self, pos, is_horiz, player):
@@ -364,52 +730,48 @@ class Board:
         if self.nb_walls[player] <= 0 or \
             not self.is_wall_possible_here(pos, is_horiz):
             return
-        if is_horiz:
-            self.horiz_walls.append(pos)
-        else:
-            self.verti_walls.append(pos)
-        self.nb_walls[player] -= 1
+        self.add_wall_with_no_check(pos, is_horiz, player)
 
     def move_pawn(self, new_pos, player):
         """Modifies the state of the board to take into account the
         new position of the pawn of player.
         """
+        (x, y) = self.pawns[player]
+        (x_, y_) = new_pos
+        self.hash ^= ZOBRIST_PAWNS[player][x * SIZE + y] ^ \
+            ZOBRIST_PAWNS[player][x_ * SIZE + y_] ^ ZOBRIST_SIDE
         self.pawns[player] = new_pos
 
+    def _push_wall(self, pos, is_horiz):
+        """Places a wall, without any check nor update of the hash."""
+        if is_horiz:
+            self.horiz_walls.append(pos)
+        else:
+            self.verti_walls.append(pos)
+
+    def _pop_wall(self, pos, is_horiz):
+        """Removes the wall placed by the last call to _push_wall()."""
+        if is_horiz:
+            self.horiz_walls.pop()
+        else:
+            self.verti_walls.pop()
+
     def is_wall_possible_here(self, pos, is_horiz):
         """
         Returns True if it is possible to put a wall in position pos
         with direction specified by is_horiz.
         """
-        (x, y) = pos
-        if x >= self.size - 1 or x < 0 or y >= self.size - 1 or y < 0:
+        if not self.is_simplified_wall_possible_here(pos, is_horiz):
             return False
-        if not (tuple(pos) in self.horiz_walls or
-                tuple(pos) in self.verti_walls):
-            wall_horiz_right = (x, y + 1) in self.horiz_walls
-            wall_horiz_left = (x, y - 1) in self.horiz_walls
-            wall_vert_up = (x - 1, y) in self.verti_walls
-            wall_vert_down = (x + 1, y) in self.verti_walls
-            if is_horiz:
-                if wall_horiz_right or wall_horiz_left:
-                    return False
-                self.horiz_walls.append(tuple(pos))
-                if not self.paths_exist():
-                    a = self.horiz_walls.pop()
-                    return False
-                self.horiz_walls.pop()
-                return True
-            else:
-                if wall_vert_up or wall_vert_down:
-                    return False
-                self.verti_walls.append(tuple(pos))
-                if not self.paths_exist():
-                    a = self.verti_walls.pop()
-                    return False
-                self.verti_walls.pop()
-                return True
+        (x, y) = pos
+        k = x * WALL_SIZE + y
+        _, _, blocked_down, blocked_right = self.get_masks()
+        if is_horiz:
+            blocked_down |= HORIZ_WALL_EDGES[k]
         else:
-            return False
+            blocked_right |= VERTI_WALL_EDGES[k]
+        return self._paths_exist(blocked_down, blocked_right,
+                                 ((x, y), is_horiz))
 
     def is_simplified_wall_possible_here(self, pos, is_horiz):
         """Similar to is_wall_possible_here() but does no path existence test"""
@@ -447,22 +809,90 @@ class Board:
                 moves.append(('P', new_pos[0], new_pos[1]))
         return moves
 
+    def get_path_edges(self, player):
+        """Returns the masks (down, right) of the edges crossed by a
+        shortest path of player that avoids the opponent pawn, in the
+        blocked_down / blocked_right layout, or None if there is none.
+        """
+        _, _, blocked_down, blocked_right = self.get_masks()
+        (x, y) = self.pawns[player]
+        cell = 1 << (x * SIZE + y)
+        goal = ROW_MASKS[self.goals[player]]
+        (x, y) = self.pawns[(player + 1) % 2]
+        free = ALL_CELLS & ~(1 << (x * SIZE + y))
+        # Breadth-first search keeping every layer of the flood fill
+        layers = []
+        seen = frontier = cell
+        while frontier and not frontier & goal:
+            layers.append(frontier)
+            frontier = flood_step(frontier, blocked_down, blocked_right) & \
+                free & ~seen
+            seen |= frontier
+        if not frontier:
+            return None
+        # Walk back from a goal cell, one layer at a time
+        cell = frontier & goal
+        cell &= -cell
+        down = right = 0
+        for layer in reversed(layers):
+            if (cell >> SIZE) & layer & ~blocked_down:
+                cell >>= SIZE
+                down |= cell
+            elif (cell << SIZE) & layer and not cell & blocked_down:
+                down |= cell
+                cell <<= SIZE
+            elif (cell >> 1) & layer & ~blocked_right:
+                cell >>= 1
+                right |= cell
+            else:
+                right |= cell
+                cell <<= 1
+        return down, right
+
     def get_legal_wall_moves(self, player):
         """Returns legal wall placements (adding a wall
         somewhere) for player.
         """
-        positions = []
-        moves = []
         if self.nb_walls[player] <= 0:
-            return moves
-        for i in range(self.size - 1):
-            for j in range(self.size - 1):
-                positions.append((i, j))
-        for pos in positions:
-            if self.is_wall_possible_here(pos, True):
-                moves.append(('WH', pos[0], pos[1]))
-            if self.is_wall_possible_here(pos, False):
-                moves.append(('WV', pos[0], pos[1]))
+            return []
+        # A wall that crosses neither shortest path leaves both paths open,
+        # only the walls crossing one of them need the path check.
+        touched_down = touched_right = 0
+        for p in (PLAYER1, PLAYER2):
+            edges = self.get_path_edges(p)
+            if edges is None:
+                touched_down = touched_right = -1
+                break
+            touched_down |= edges[0]
+            touched_right |= edges[1]
+        return self._legal_wall_moves(touched_down, touched_right)
+
+    def _legal_wall_moves(self, touched_down, touched_right):
+        """Returns the walls that can be placed on the board. The path
+        check is skipped for the walls that close none of the edges in
+        the touched masks.
+        """
+        moves = []
+        horiz_mask, verti_mask, blocked_down, blocked_right = \
+            self.get_masks()
+        taken = horiz_mask | verti_mask
+        for i in range(WALL_SIZE):
+            for j in range(WALL_SIZE):
+                k = i * WALL_SIZE + j
+                if (taken >> k) & 1:
+                    continue
+                edges = HORIZ_WALL_EDGES[k]
+                if not horiz_mask & HORIZ_WALL_CONFLICTS[k] and \
+                        (not edges & touched_down or self._paths_exist(
+                            blocked_down | edges, blocked_right,
+                            ((i, j), True))):
+                    moves.append(('WH', i, j))
+                edges = VERTI_WALL_EDGES[k]
+                if not verti_mask & VERTI_WALL_CONFLICTS[k] and \
+                        (not edges & touched_right or self._paths_exist(
+                            blocked_down, blocked_right | edges,
+                            ((i, j), False))):
+                    moves.append(('WV', i, j))
         return moves
 
     def get_actions(self, player):
@@ -493,17 +923,24 @@ class Board:
         """Similar to play_action() but does no path existence test"""
         kind, x, y = action
         if kind == 'WH':
+            token = (kind, player, (x, y), self.hash)
             self.add_wall_with_no_check((x, y), True, player)
+            return token
         elif kind == 'WV':
+            token = (kind, player, (x, y), self.hash)
             self.add_wall_with_no_check((x, y), False, player)
+            return token
         elif kind == 'P':
+            token = (kind, player, self.pawns[player], self.hash)
             self.move_pawn((x, y), player)
+            return token
 
     def play_action(self, action, player):
         """Play an action if it is valid.
 
         If the action is invalid, raise an InvalidAction exception.
-        Return self.
+        Return a token that can be given to undo_action() to take the
+        action back.
 
         Arguments:
         action -- the action to be played
@@ -516,18 +953,33 @@ class Board:
             if not self.is_action_valid(action, player):
                 raise InvalidAction(action, player)
             kind, x, y = action
-            if kind == 'WH':
-                self.add_wall((x, y), True, player)
-            elif kind == 'WV':
-                self.add_wall((x, y), False, player)
+            if kind == 'WH' or kind == 'WV':
+                if self.nb_walls[player] <= 0:
+                    # add_wall() does nothing, nor will undo_action()
+                    token = (kind, player, None, self.hash)
+                    self.hash ^= ZOBRIST_SIDE
+                    return token
+                return self.play_action_with_no_check(action, player)
             elif kind == 'P':
-                self.move_pawn((x, y), player)
+                return self.play_action_with_no_check(action, player)
             else:
                 raise InvalidAction(action, player)
-            return self
         except Exception:
             raise InvalidAction(action, player)
 
+    def undo_action(self, token):
+        """Take back the action that returned token when played.
+
+        Actions must be undone in the reverse order of the one in which
+        they were played.
+        """
+        kind, player, previous, self.hash = token
+        if kind == 'P':
+            self.pawns[player] = previous
+        elif previous is not None:
+            self._pop_wall(previous, kind == 'WH')
+            self.nb_walls[player] += 1
+
     def is_finished(self):
         """Return whether no more moves can be made (i.e.,
         game finished).
@@ -539,8 +991,9 @@ class Board:
         """Return a score for this board for the given player.
 
         The score is the difference between the lengths of the shortest path
-        of the player minus the one of its opponent. It also takes into
-        account the remaining number of walls.
+        of the player minus the one of its opponent, both ignoring the pawns
+        (see get_goal_distances()). It also takes into account the remaining
+        number of walls.
 
         """
         score = self.min_steps_before_victory((player + 1) % 2) - \
@@ -550,6 +1003,155 @@ class Board:
         return score
 
 
+class BitBoard(Board):
+
+    """
+    Representation of a Quoridor Board backed by bitmasks.
+
+    The wall lists are kept so that code iterating over them keeps working,
+    but every wall and edge query is answered from the masks described at
+    the top of this module.
+    """
+
+    def __init__(self, percepts=None):
+        Board.__init__(self, percepts)
+        (self.horiz_mask, self.verti_mask,
+         self.blocked_down, self.blocked_right) = \
+            wall_masks(self.horiz_walls, self.verti_walls)
+
+    def has_horiz_wall(self, x, y):
+        """Returns True if there is a horizontal wall in slot (x, y)."""
+        return bool(self.horiz_mask & _wall_bit(x, y))
+
+    def has_verti_wall(self, x, y):
+        """Returns True if there is a vertical wall in slot (x, y)."""
+        return bool(self.verti_mask & _wall_bit(x, y))
+
+    def __str__(self):
+        """String representation of the board"""
+        # Pad every row of slots with a zero column on each side so that
+        # the neighbours of slot (i, j) never wrap to another row.
+        horiz = verti = 0
+        for i in range(WALL_SIZE):
+            horiz |= ((self.horiz_mask >> (i * WALL_SIZE)) & 0xff) << \
+                (i * 10 + 1)
+            verti |= ((self.verti_mask >> (i * WALL_SIZE)) & 0xff) << \
+                ((i + 1) * 10 + 1)
+        pawns = [tuple(pawn) for pawn in self.pawns]
+        board_str = ""
+        for i in range(self.size):
+            for j in range(self.size):
+                if pawns[0] == (i, j):
+                    board_str += "P1"
+                elif pawns[1] == (i, j):
+                    board_str += "P2"
+                else:
+                    board_str += "OO"
+                if (verti >> ((i + 1) * 10 + j + 1)) & 1 or \
+                        (verti >> (i * 10 + j + 1)) & 1:
+                    board_str += "|"
+                else:
+                    board_str += " "
+            board_str += "\n"
+            for j in range(self.size):
+                if (horiz >> (i * 10 + j + 1)) & 1:
+                    board_str += "---"
+                elif (horiz >> (i * 10 + j)) & 1:
+                    board_str += "-- "
+                elif (verti >> ((i + 1) * 10 + j + 1)) & 1:
+                    board_str += "  |"
+                else:
+                    board_str += "   "
+            board_str += "\n"
+        return board_str
+
+    def clone(self):
+        """Return a clone of this object."""
+        clone_board = BitBoard()
+        clone_board.pawns[0] = self.pawns[0]
+        clone_board.pawns[1] = self.pawns[1]
+        clone_board.goals[0] = self.goals[0]
+        clone_board.goals[1] = self.goals[1]
+        clone_board.nb_walls[0] = self.nb_walls[0]
+        clone_board.nb_walls[1] = self.nb_walls[1]
+        clone_board.horiz_walls = list(self.horiz_walls)
+        clone_board.verti_walls = list(self.verti_walls)
+        clone_board.horiz_mask = self.horiz_mask
+        clone_board.verti_mask = self.verti_mask
+        clone_board.blocked_down = self.blocked_down
+        clone_board.blocked_right = self.blocked_right
+        clone_board._goal_distances = list(self._goal_distances)
+        clone_board.hash = self.hash
+        return clone_board
+
+    def is_simplified_pawn_move_ok(self, former_pos, new_pos):
+        """Returns True if moving one pawn from former_pos to new_pos
+        is valid i.e. it respects the rules of quoridor (without the
+        heap move above the opponent)
+        """
+        (row_form, col_form) = former_pos
+        (row_new, col_new) = new_pos
+
+        if row_new >= self.size or row_new < 0 or \
+            col_new >= self.size or col_new < 0:
+            return False
+        cell = row_form * SIZE + col_form
+        if col_new == col_form:
+            if row_new == row_form + 1:
+                return not (self.blocked_down >> cell) & 1
+            if row_new == row_form - 1:
+                return not (self.blocked_down >> (cell - SIZE)) & 1
+        elif row_new == row_form:
+            if col_new == col_form + 1:
+                return not (self.blocked_right >> cell) & 1
+            if col_new == col_form - 1:
+                return not (self.blocked_right >> (cell - 1)) & 1
+        return False
+
+    def _push_wall(self, pos, is_horiz):
+        """Places a wall, without any check nor update of the hash."""
+        k = pos[0] * WALL_SIZE + pos[1]
+        if is_horiz:
+            self.horiz_walls.append(tuple(pos))
+            self.horiz_mask |= 1 << k
+            self.blocked_down |= HORIZ_WALL_EDGES[k]
+        else:
+            self.verti_walls.append(tuple(pos))
+            self.verti_mask |= 1 << k
+            self.blocked_right |= VERTI_WALL_EDGES[k]
+
+    def is_simplified_wall_possible_here(self, pos, is_horiz):
+        """Similar to is_wall_possible_here() but does no path existence test"""
+        (x, y) = pos
+        if x >= WALL_SIZE or x < 0 or y >= WALL_SIZE or y < 0:
+            return False
+        k = x * WALL_SIZE + y
+        if ((self.horiz_mask | self.verti_mask) >> k) & 1:
+            return False
+        if is_horiz:
+            return not self.horiz_mask & HORIZ_WALL_CONFLICTS[k]
+        return not self.verti_mask & VERTI_WALL_CONFLICTS[k]
+
+    def get_masks(self):
+        """Returns the tuple (horiz_mask, verti_mask, blocked_down,
+        blocked_right) describing the walls, see wall_masks().
+        """
+        return (self.horiz_mask, self.verti_mask,
+                self.blocked_down, self.blocked_right)
+
+    def _pop_wall(self, pos, is_horiz):
+        """Removes the wall placed by the last call to _push_wall()."""
+        k = pos[0] * WALL_SIZE + pos[1]
+        if is_horiz:
+            self.horiz_walls.pop()
+            self.horiz_mask &= ~(1 << k)
+            self.blocked_down &= ~HORIZ_WALL_EDGES[k]
+        else:
+            self.verti_walls.pop()
+            self.verti_mask &= ~(1 << k)
+            self.blocked_right &= ~VERTI_WALL_EDGES[k]
+
+
 def dict_to_board(dictio):
     """Return a clone of the board object encoded as a dictionary."""
     clone_board = Board()
@@ -563,9 +1165,19 @@ def dict_to_board(dictio):
         clone_board.verti_walls.append((x, y))
     clone_board.nb_walls[0] = dictio['nb_walls'][0]
     clone_board.nb_walls[1] = dictio['nb_walls'][1]
+    clone_board.hash = clone_board.compute_hash()
     return clone_board
 
 
+def dict_to_bitboard(dictio):
+    """Return a BitBoard equivalent to the board encoded as a dictionary,
+    or dictio itself if it is already a BitBoard.
+    """
+    if isinstance(dictio, BitBoard):
+        return dictio
+    return BitBoard(dictio)
+
+
 def load_percepts(csvfile):
     """Load percepts from a CSV file.
 
@@ -623,6 +1235,68 @@ class Agent:
         pass
 
 
+class IncrementalAgent(Agent):
+
+    """Agent keeping its own copy of the board between the moves.
+
+    The game sends the whole board to play() at every move. An incremental
+    agent returns {'incremental': True} from initialize() and is then sent
+    only the last action of its opponent, to play_incremental(), with the
+    hash of the position to check that both boards agree. When they do not,
+    the game sends the whole board again to resync().
+
+    The subclasses implement play() as any agent. It is given a BitBoard,
+    a copy of the board of the agent, instead of the percepts.
+    """
+
+    def initialize(self, percepts, players, time_left):
+        self.game_board = dict_to_bitboard(percepts)
+        return {'incremental': True}
+
+    def play_incremental(self, action, player, step, board_hash, time_left):
+        """Play the action of the opponent on the board of the agent, then
+        play and return an action.
+
+        Arguments:
+        action -- the last action of the opponent, None at the first move
+        player -- the player to control in this step
+        step -- the current step number, starting from 1
+        board_hash -- the hash of the position given by
+            Board.compute_hash(), as 16 hexadecimal digits since XML-RPC
+            integers have 32 bits
+        time_left -- the seconds left from the time credit, or None
+
+        Return None, without playing, when the board of the agent does not
+        have board_hash: the game then calls resync().
+        """
+        board = self.game_board
+        if board is None:
+            return None
+        if action is not None:
+            board.play_action_with_no_check(tuple(action), 1 - player)
+        if '%016x' % board.compute_hash() != board_hash:
+            self.game_board = None
+            return None
+        return self.play_own(player, step, time_left)
+
+    def resync(self, percepts, player, step, time_left):
+        """Replace the board of the agent by percepts, then play and return
+        an action.
+        """
+        self.game_board = dict_to_bitboard(percepts)
+        # The side to move in the hash is the parity of the actions played
+        # since the start of the game, as on a board kept up to date
+        if (step - 1) % 2:
+            self.game_board.hash ^= ZOBRIST_SIDE
+        return self.play_own(player, step, time_left)
+
+    def play_own(self, player, step, time_left):
+        action = self.play(self.game_board.clone(), player, step, time_left)
+        if action is not None:
+            self.game_board.play_action_with_no_check(tuple(action), player)
+        return action
+
+
 def serve_agent(agent, address, port):
     """Serve agent on specified bind address and port number."""
     from xmlrpc.server import SimpleXMLRPCServer
@@ -663,10 +1337,48 @@ def agent_main(agent, args_cb=None, setup_cb=None):
                         help="bind to address ADDRESS (default: *)")
     parser.add_argument("-p", "--port", type=portarg, default=8000,
                         help="set port number (default: %(default)s)")
+    parser.add_argument("-l", "--listen", metavar="URI",
+                        help="serve with the binary transport on URI," +
+                             " tcp://HOST:PORT or unix://PATH, rather than" +
+                             " XML-RPC on ADDRESS and PORT")
+    parser.add_argument("-s", "--sessions", type=int, metavar="WORKERS",
+                        help="play many games at once, each with its own" +
+                             " agent, searched by WORKERS processes")
+    parser.add_argument("--metrics", type=float, metavar="SECONDS",
+                        help="print the metrics of the sessions every" +
+                             " SECONDS (with -s)")
     if args_cb is not None:
         args_cb(agent, parser)
     args = parser.parse_args()
+    if args.listen is not None:
+        import transport
+        try:
+            transport.parse_uri(args.listen)
+        except ValueError as e:
+            parser.error("argument -l/--listen: %s" % e)
+    if args.sessions is not None:
+        if args.sessions < 1:
+            parser.error("argument -s/--sessions: must be at least 1")
+        # The processes of the sessions are their only workers
+        if getattr(args, 'workers', 1) > 1:
+            parser.error("argument -s/--sessions: not allowed with" +
+                         " argument -w/--workers")
+    if args.metrics is not None:
+        if args.sessions is None:
+            parser.error("argument --metrics: requires -s/--sessions")
+        if args.metrics <= 0:
+            parser.error("argument --metrics: must be positive")
     if setup_cb is not None:
         setup_cb(agent, parser, args)
 
-    serve_agent(agent, args.address, args.port)
+    if args.sessions is not None:
+        import session_server
+        uri = args.listen
+        if uri is None:
+            uri = "http://%s:%d" % (args.address, args.port)
+        session_server.serve_sessions(agent, args.sessions, uri,
+                                      args.metrics)
+    elif args.listen is not None:
+        transport.serve_framed(agent, args.listen)
+    else:
+        serve_agent(agent, args.address, args.port)
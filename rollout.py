@@ -0,0 +1,175 @@
+"""
+Fast simulated games for the Monte Carlo agents.
+
+A rollout plays both players from a position to the end of the game, or up
+to a number of moves, on a RolloutBoard: the position reduced to the pawn
+cells, the wall masks and the walls left. There is no hash, no wall list and
+no legality check beyond what the playout policy needs:
+- a player moves its pawn one step down a shortest path, jumping over the
+  opponent pawn when it stands on the way;
+- with probability wall_prob, it rather places a wall across the next step
+  of the opponent, if the wall fits and both goals stay reachable.
+
+The cells and wall slots use the bit layout described in quoridor.py.
+"""
+
+import random
+
+from quoridor import (SIZE, WALL_SIZE, HORIZ_WALL_EDGES, VERTI_WALL_EDGES,
+                      HORIZ_WALL_CONFLICTS, VERTI_WALL_CONFLICTS,
+                      UNREACHABLE, distance_layers, cell_neighbours,
+                      pawn_targets)
+
+
+class RolloutBoard:
+
+    """Position of a rollout, played without undo.
+
+    The distances to the goals are not kept cell by cell but as the layers
+    of distance_layers(), with the distance of each pawn. A pawn moves by
+    one or two cells, so the distance of its target is found by looking at
+    the few layers around its own.
+    """
+
+    def __init__(self, board):
+        """Copy the position of board, a Board or a BitBoard."""
+        (self.horiz_mask, self.verti_mask,
+         self.blocked_down, self.blocked_right) = board.get_masks()
+        self.pawns = [x * SIZE + y for (x, y) in board.pawns]
+        self.goals = list(board.goals)
+        self.nb_walls = list(board.nb_walls)
+        # Layers taken from the cache of board, replaced but never modified
+        self.layers = [None, None]
+        self.steps = [0, 0]
+        for player in (0, 1):
+            dist = board.get_goal_distances(player)
+            self.layers[player] = board.get_distance_layers(player)
+            self.steps[player] = dist[self.pawns[player]]
+
+    def is_finished(self):
+        return self.pawns[0] // SIZE == self.goals[0] or \
+            self.pawns[1] // SIZE == self.goals[1]
+
+    def distance(self, player, cell, near=None):
+        """Return the number of moves player needs from cell, ignoring the
+        pawns, knowing it is at most 2 away from near if near is given.
+        """
+        layers = self.layers[player]
+        bit = 1 << cell
+        first = 0 if near is None else max(0, near - 2)
+        last = len(layers) if near is None else min(len(layers), near + 3)
+        for d in range(first, last):
+            if layers[d] & bit:
+                return d
+        return UNREACHABLE
+
+    def neighbours(self, cell):
+        """Return the cells reachable from cell in one step, ignoring the
+        pawns.
+        """
+        return cell_neighbours(cell, self.blocked_down, self.blocked_right)
+
+    def pawn_moves(self, player):
+        """Return the cells the pawn of player can move to."""
+        return pawn_targets(self.pawns[player], self.pawns[1 - player],
+                            self.neighbours)
+
+    def move_pawn(self, player):
+        """Move the pawn of player to the reachable cell closest to its
+        goal. Return False if it cannot move.
+        """
+        near = self.steps[player]
+        best = None
+        best_d = UNREACHABLE + 1
+        for target in self.pawn_moves(player):
+            d = self.distance(player, target, near)
+            if d < best_d:
+                best, best_d = target, d
+        if best is None:
+            return False
+        self.pawns[player] = best
+        self.steps[player] = best_d
+        return True
+
+    def place_wall(self, player, rng):
+        """Place for player a wall across the next step of the opponent
+        along a shortest path. Return False if no such wall fits.
+        """
+        opponent = 1 - player
+        cell = self.pawns[opponent]
+        d = self.steps[opponent]
+        if d == 0:
+            return False
+        closer = self.layers[opponent][d - 1]
+        for target in self.neighbours(cell):
+            if (closer >> target) & 1:
+                break
+        else:
+            return False
+        # The wall slots whose wall closes the edge between cell and target
+        (x, y) = divmod(min(cell, target), SIZE)
+        if target - cell in (SIZE, -SIZE):
+            slots = [(x, y, True), (x, y - 1, True)]
+        else:
+            slots = [(x, y, False), (x - 1, y, False)]
+        if rng.random() < 0.5:
+            slots.reverse()
+        for (x, y, is_horiz) in slots:
+            if 0 <= x < WALL_SIZE and 0 <= y < WALL_SIZE and \
+                    self.try_wall(x * WALL_SIZE + y, is_horiz, player):
+                return True
+        return False
+
+    def try_wall(self, k, is_horiz, player):
+        """Place the wall of slot k for player if it does not overlap the
+        other walls and both goals stay reachable, ignoring the pawns.
+        """
+        if ((self.horiz_mask | self.verti_mask) >> k) & 1:
+            return False
+        blocked_down, blocked_right = self.blocked_down, self.blocked_right
+        if is_horiz:
+            if self.horiz_mask & HORIZ_WALL_CONFLICTS[k]:
+                return False
+            blocked_down |= HORIZ_WALL_EDGES[k]
+        else:
+            if self.verti_mask & VERTI_WALL_CONFLICTS[k]:
+                return False
+            blocked_right |= VERTI_WALL_EDGES[k]
+        # The new layers tell whether the goals stay reachable
+        layers = [distance_layers(self.goals[p], blocked_down, blocked_right)
+                  for p in (0, 1)]
+        old_layers, self.layers = self.layers, layers
+        steps = [self.distance(p, self.pawns[p]) for p in (0, 1)]
+        if UNREACHABLE in steps:
+            self.layers = old_layers
+            return False
+        if is_horiz:
+            self.horiz_mask |= 1 << k
+        else:
+            self.verti_mask |= 1 << k
+        self.blocked_down, self.blocked_right = blocked_down, blocked_right
+        self.nb_walls[player] -= 1
+        self.steps = steps
+        return True
+
+
+def rollout(board, player, max_moves=None, wall_prob=0.2, rng=random):
+    """Play a simulated game from board, player to move, and return the
+    number of moves the opponent of player still needs minus the ones
+    player needs at the end, as get_score() does.
+
+    The game stops when a pawn reaches its goal, or after max_moves moves
+    if max_moves is not None.
+    """
+    state = RolloutBoard(board)
+    to_move = player
+    moves = 0
+    while not state.is_finished() and moves != max_moves:
+        if state.nb_walls[to_move] > 0 and rng.random() < wall_prob and \
+                state.place_wall(to_move, rng):
+            pass
+        elif not state.move_pawn(to_move):
+            break
+        to_move = 1 - to_move
+        moves += 1
+    return state.steps[1 - player] - state.steps[player]
@@ -0,0 +1,105 @@
+"""
+Root-parallel Monte Carlo tree search.
+
+Each worker process owns an agent and runs its own mtc_search() from the
+same percepts with its own seed. The statistics of the children of the
+roots are then summed by action, so that the final choice is made on the
+visits of all the workers.
+"""
+
+import multiprocessing
+import random
+
+from node_store import ROOT
+
+# Agent of the current worker process, see _init_worker()
+_agent = None
+
+
+def _init_worker(agent_class, options):
+    """Create the agent of a worker process."""
+    global _agent
+    _agent = agent_class(**options)
+
+
+def _search(task):
+    """Run one search in a worker process and return the pair
+    (iterations, [(action, visit, score) for each child of the root]).
+    """
+    percepts, player, time_left, seed = task
+    random.seed(seed)
+    _agent.player = player
+    _agent.time_left = time_left
+    _agent.mtc_search(percepts, player)
+    return _agent.iterations, _agent.mcts.tree.statistics(ROOT)
+
+
+class RootParallelSearch:
+
+    """Pool of worker processes searching the same position.
+
+    The pool is started once by start() and reused for every move, so the
+    cost of starting the processes is only paid once per game.
+    """
+
+    def __init__(self, agent_class, workers, seed=None, options=None):
+        """
+        Arguments:
+        agent_class -- class of the agent run by each worker, an
+            MCTSAgent
+        workers -- number of worker processes
+        seed -- seed of the seeds given to the workers (None for random)
+        options -- keyword arguments of agent_class in the workers
+        """
+        self.agent_class = agent_class
+        self.options = options or {}
+        self.workers = workers
+        self.random = random.Random(seed)
+        self.pool = None
+        self.iterations = 0
+
+    def start(self):
+        """Start the worker processes if they are not running."""
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.workers, _init_worker,
+                                             (self.agent_class, self.options))
+
+    def close(self):
+        """Stop the worker processes."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, percepts, player, time_left):
+        """Search percepts in every worker and return the merged list of
+        (action, visit, score) for the children of the root.
+        """
+        self.start()
+        tasks = [(percepts, player, time_left, self.random.getrandbits(32))
+                 for _ in range(self.workers)]
+        merged = {}
+        self.iterations = 0
+        for iterations, children in self.pool.map(_search, tasks, 1):
+            self.iterations += iterations
+            for action, visit, score in children:
+                stats = merged.setdefault(action, [0, 0])
+                stats[0] += visit
+                stats[1] += score
+        return [(action, visit, score)
+                for action, (visit, score) in merged.items()]
+
+
+def add_arguments(agent, parser):
+    """args_cb of agent_main() adding the --workers option."""
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of search processes, each searching" +
+                             " the whole tree (default: %(default)s)")
+
+
+def setup(agent, parser, args):
+    """setup_cb of agent_main() starting the workers with the server."""
+    if args.workers < 1:
+        parser.error("argument -w/--workers: must be at least 1")
+    agent.workers = args.workers
+    agent.start_workers()
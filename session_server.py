@@ -0,0 +1,360 @@
+"""
+Agent server playing many games at once.
+
+serve_agent() and transport.serve_framed() serve one agent instance, one
+call at a time. The agents keep the state of their game in self (the
+player, the step, the tree of the search), so such a server can only play
+one game. A SessionServer keys that state by session instead: each session
+has its own agent, created by initialize() from the class and the
+options() of the agent served, and kept in one of the worker processes.
+A worker searches for all the sessions given to it, one call at a time,
+the sessions being spread over the workers as they are opened.
+
+A session is a connection of the binary transport, or the path of the URL
+for XML-RPC: the games connecting to http://host:port/game1 and
+http://host:port/game2 are two sessions. A session of the binary
+transport is closed with its connection. An XML-RPC session is closed by
+the close() call of its client, as tournament.py does after each game,
+or, for clients that never call it, after some idle time.
+
+For each session, the server measures the latency of the calls, the part
+of it spent waiting for the worker, and the depth of the queue of the
+worker when the call arrived: the number of calls of other sessions in
+front of it.
+
+Usage: python3 my_player.py -s WORKERS [-p PORT | -l URI] [--metrics SECONDS]
+"""
+
+import concurrent.futures
+import itertools
+import os
+import random
+import socketserver
+import threading
+import time
+import urllib.parse
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+import transport
+
+# Methods of the agents called by the game
+METHODS = ('initialize', 'play', 'play_incremental', 'resync')
+
+# Seconds without a call after which an XML-RPC session that was not
+# closed by its client is closed
+IDLE_TIMEOUT = 600.0
+
+# Agents of the sessions of the current worker process, see _init_worker()
+_agent_class = None
+_options = None
+_agents = {}
+
+
+def _init_worker(agent_class, options):
+    """Set the class and the options of the agents of a worker process."""
+    global _agent_class, _options
+    _agent_class = agent_class
+    _options = options
+    # Each worker draws its own random numbers, whatever the way the
+    # processes are started
+    random.seed()
+
+
+def _call(session_id, method, args):
+    """Run method on the agent of the session in a worker process and return
+    the pair (result, seconds taken). initialize() creates a new agent.
+    """
+    start = time.perf_counter()
+    if method == 'initialize':
+        _agents[session_id] = _agent_class(**_options)
+    try:
+        agent = _agents[session_id]
+    except KeyError:
+        raise RuntimeError("session %s is not initialized" % session_id)
+    result = getattr(agent, method)(*args)
+    return result, time.perf_counter() - start
+
+
+def _close(session_id):
+    """Drop the agent of the session in a worker process."""
+    _agents.pop(session_id, None)
+
+
+class Session:
+
+    """A game served by a SessionServer, and the metrics of its calls.
+
+    Attributes:
+    id -- the key of the session
+    worker -- index of the worker process running its agent
+    expires -- whether the session is closed after IDLE_TIMEOUT seconds
+        without a call
+    calls -- number of calls answered
+    latency, max_latency -- total and largest seconds taken by the calls
+    wait -- total seconds the calls spent out of the agent: in the queue
+        of the worker and in the transfers to it
+    depth, max_depth -- total and largest number of calls of the worker
+        found in front of the calls of the session
+    """
+
+    def __init__(self, id, worker, expires):
+        self.id = id
+        self.worker = worker
+        self.expires = expires
+        self.opened = self.last_call = time.time()
+        self.calls = 0
+        self.latency = self.max_latency = 0.0
+        self.wait = 0.0
+        self.depth = self.max_depth = 0
+
+    def add_call(self, latency, elapsed, depth):
+        """Count a call taking latency seconds, elapsed of them in the
+        agent, that found depth calls queued on the worker.
+        """
+        self.calls += 1
+        self.last_call = time.time()
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.wait += max(0.0, latency - elapsed)
+        self.depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def report(self):
+        """Return a line of the metrics of the session."""
+        calls = self.calls or 1
+        return ("%-24s worker %2d %5d calls %8.3f s mean %8.3f s max"
+                " %8.3f s wait  queue %5.2f mean %3d max" %
+                (self.id, self.worker, self.calls, self.latency / calls,
+                 self.max_latency, self.wait / calls, self.depth / calls,
+                 self.max_depth))
+
+
+class SessionAgent:
+
+    """The agent of one session of a SessionServer, with the methods of
+    Agent, as given to transport.handle_request().
+    """
+
+    def __init__(self, sessions, session_id):
+        self.sessions = sessions
+        self.session_id = session_id
+
+    def initialize(self, percepts, players, time_left):
+        return self.sessions.call(self.session_id, 'initialize', percepts,
+                                  players, time_left)
+
+    def play(self, percepts, player, step, time_left):
+        return self.sessions.call(self.session_id, 'play', percepts, player,
+                                  step, time_left)
+
+    def play_incremental(self, action, player, step, board_hash, time_left):
+        return self.sessions.call(self.session_id, 'play_incremental',
+                                  action, player, step, board_hash, time_left)
+
+    def resync(self, percepts, player, step, time_left):
+        return self.sessions.call(self.session_id, 'resync', percepts,
+                                  player, step, time_left)
+
+
+class SessionServer:
+
+    """Agents of many sessions on a pool of worker processes.
+
+    Each worker is a process of its own executor, so that the calls of a
+    session always reach the process holding its agent. The methods may be
+    called from several threads.
+    """
+
+    def __init__(self, agent_class, workers, options=None,
+                 idle_timeout=IDLE_TIMEOUT):
+        """
+        Arguments:
+        agent_class -- class of the agents of the sessions
+        workers -- number of worker processes
+        options -- keyword arguments of agent_class
+        idle_timeout -- seconds without a call after which a session that
+            expires is closed
+        """
+        self.agent_class = agent_class
+        self.options = options or {}
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.closed = 0
+        self.counter = itertools.count(1)
+        # Sessions and calls in progress of each worker
+        self.load = [0] * workers
+        self.pending = [0] * workers
+        self.executors = [concurrent.futures.ProcessPoolExecutor(
+            1, initializer=_init_worker,
+            initargs=(agent_class, self.options)) for _ in range(workers)]
+        # Start the processes now rather than from the threads serving the
+        # requests
+        self.pids = [executor.submit(os.getpid).result()
+                     for executor in self.executors]
+
+    def open(self, session_id=None, expires=True):
+        """Open a session on the least loaded worker and return its id, a
+        new one if session_id is None.
+        """
+        self.expire()
+        with self.lock:
+            if session_id is None:
+                session_id = "connection %d" % next(self.counter)
+            if session_id not in self.sessions:
+                worker = min(range(len(self.load)), key=self.load.__getitem__)
+                self.load[worker] += 1
+                self.sessions[session_id] = Session(session_id, worker,
+                                                    expires)
+        return session_id
+
+    def close(self, session_id):
+        """Close the session and drop its agent."""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None:
+                return
+            self.load[session.worker] -= 1
+            self.closed += 1
+        self.executors[session.worker].submit(_close, session_id)
+        print("Closed", session.report())
+
+    def expire(self):
+        """Close the sessions that expire and went idle."""
+        deadline = time.time() - self.idle_timeout
+        with self.lock:
+            idle = [session.id for session in self.sessions.values()
+                    if session.expires and session.last_call < deadline]
+        for session_id in idle:
+            self.close(session_id)
+
+    def agent(self, session_id):
+        """Return the SessionAgent of the session."""
+        return SessionAgent(self, session_id)
+
+    def call(self, session_id, method, *args):
+        """Run method on the agent of the session, opening it if needed,
+        and return its result.
+        """
+        if method not in METHODS:
+            raise ValueError("unknown method %s" % method)
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            self.open(session_id)
+            with self.lock:
+                session = self.sessions[session_id]
+        worker = session.worker
+        with self.lock:
+            depth = self.pending[worker]
+            self.pending[worker] += 1
+        start = time.perf_counter()
+        elapsed = 0.0
+        try:
+            future = self.executors[worker].submit(_call, session_id, method,
+                                                   args)
+            result, elapsed = future.result()
+        finally:
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.pending[worker] -= 1
+                session.add_call(latency, elapsed, depth)
+        return result
+
+    def report(self):
+        """Print the metrics of the open sessions and of the workers."""
+        with self.lock:
+            sessions = list(self.sessions.values())
+            load = list(self.load)
+            pending = list(self.pending)
+        print("%d sessions open, %d closed" % (len(sessions),
+                                               self.closed))
+        for worker, pid in enumerate(self.pids):
+            print("worker %2d pid %6d %4d sessions %4d calls queued" %
+                  (worker, pid, load[worker], pending[worker]))
+        for session in sessions:
+            print(session.report())
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        for executor in self.executors:
+            executor.shutdown(cancel_futures=True)
+
+
+class SessionFramedHandler(transport.FramedHandler):
+
+    """Serves one connection of the binary transport as a session."""
+
+    def setup(self):
+        sessions = self.server.sessions
+        self.agent = sessions.agent(sessions.open(expires=False))
+
+    def call(self, request):
+        # The sessions run their calls at once, on their own agents
+        return transport.handle_request(self.agent, request)
+
+    def finish(self):
+        self.server.sessions.close(self.agent.session_id)
+
+
+class SessionXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
+
+    """Serves the XML-RPC calls to any path, the path naming the session."""
+
+    rpc_paths = ()
+
+    def _dispatch(self, method, params):
+        if method == 'close':
+            self.server.sessions.close(self.path)
+            return True
+        return self.server.sessions.call(self.path, method, *params)
+
+
+class ThreadingXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+def make_server(sessions, uri):
+    """Return the server of sessions listening on uri, a URI of the binary
+    transport or http://host:port for XML-RPC, a thread per connection.
+    """
+    if transport.is_framed(uri):
+        # The handler finds the agent of its connection in sessions
+        server = transport.make_server(None, uri, SessionFramedHandler)
+    else:
+        parts = urllib.parse.urlsplit(uri)
+        if parts.scheme != 'http' or parts.port is None:
+            raise ValueError("%s is not a http://host:port URI" % uri)
+        server = ThreadingXMLRPCServer((parts.hostname or '', parts.port),
+                                       SessionXMLRPCRequestHandler,
+                                       logRequests=False, allow_none=True)
+    server.sessions = sessions
+    return server
+
+
+def serve_sessions(agent, workers, uri, period=None):
+    """Serve sessions of agents configured as agent on uri until
+    interrupted, printing the metrics every period seconds if given.
+
+    The agents of the sessions are created from the class of agent and its
+    options(), if it has any.
+    """
+    options = agent.options() if hasattr(agent, 'options') else {}
+    sessions = SessionServer(type(agent), workers, options)
+    server = make_server(sessions, uri)
+    stop = threading.Event()
+    if period is not None:
+        def report():
+            while not stop.wait(period):
+                sessions.report()
+        threading.Thread(target=report, daemon=True).start()
+    print("Listening on", uri, "with", workers, "workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        sessions.report()
+        sessions.shutdown()
@@ -0,0 +1,87 @@
+"""
+Time budget of the search agents.
+
+Game.timed_exec() charges every call to the agent against a single credit
+for the whole game, so the time of each move has to be planned from the
+credit left rather than fixed.
+"""
+
+import time
+
+from quoridor import NoPath
+
+
+class TimeManager:
+
+    """Decides how long the search of each move may run.
+
+    The credit left, minus a safety margin for the XML-RPC round trip, is
+    shared among the moves the game is expected to last. The search also
+    stops early once the most visited child of the root cannot be caught
+    up within the remaining budget.
+    """
+
+    def __init__(self, max_budget=10.0, min_budget=0.05, safety_margin=1.0,
+                 check_every=32):
+        """
+        Arguments:
+        max_budget -- the longest search of a move in seconds, also used
+            when the game is not time-limited
+        min_budget -- the shortest search of a move in seconds
+        safety_margin -- seconds of the credit that are never spent
+        check_every -- number of iterations between two stability checks
+        """
+        self.max_budget = max_budget
+        self.min_budget = min_budget
+        self.safety_margin = safety_margin
+        self.check_every = check_every
+        self.start_time = 0.0
+        self.budget = max_budget
+
+    def moves_left(self, board, player):
+        """Returns the estimated number of moves player still has to play.
+
+        The game ends at the latest when the closest pawn reaches its goal,
+        and each wall left is likely to delay that by half a move.
+        """
+        try:
+            steps = min(board.min_steps_before_victory(player),
+                        board.min_steps_before_victory(1 - player))
+        except NoPath:
+            steps = board.size
+        return max(2, steps + (board.nb_walls[0] + board.nb_walls[1]) // 2)
+
+    def start(self, board, player, time_left):
+        """Starts the clock of a move and returns its budget in seconds."""
+        self.start_time = time.perf_counter()
+        if time_left is None:
+            self.budget = self.max_budget
+        else:
+            spare = time_left - self.safety_margin
+            budget = spare / self.moves_left(board, player)
+            self.budget = max(0.0, min(self.max_budget, spare,
+                                       max(self.min_budget, budget)))
+        return self.budget
+
+    def elapsed(self):
+        """Returns the seconds spent since start()."""
+        return time.perf_counter() - self.start_time
+
+    def should_stop(self, iterations, child_visits):
+        """Returns True if the search must stop after iterations.
+
+        child_visits is a function returning the visit counts of the children
+        of the root. It is only called every check_every iterations.
+        """
+        elapsed = self.elapsed()
+        if elapsed >= self.budget:
+            return True
+        if iterations == 0 or iterations % self.check_every:
+            return False
+        visits = sorted(child_visits(), reverse=True)
+        if len(visits) < 2:
+            # A single move is no decision to make
+            return len(visits) == 1
+        # Iterations still expected at the current speed
+        remaining = iterations * (self.budget - elapsed) / elapsed
+        return visits[0] - visits[1] > remaining
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Tournament between two Quoridor agents.
+
+The agents are usually classes loaded in the worker processes, given as
+module:Class (e.g. my_player:MyAgent). Each game is a Game between two new
+instances, played in a process of a pool so that the
+games run in parallel, one per core by default. The agents swap colours
+from one game to the next. The Trace of every game is kept, and written
+to a directory if asked, to be replayed with game.py -r.
+
+An agent can also be an agent server serving sessions (see
+session_server.py), given by its URI: each game then opens its own sessions
+on the server, which plays all of them at once.
+
+With an SPRT (sequential probability ratio test), the games are scheduled
+as the workers free up and the match stops as soon as the results tell
+whether the first agent is at least elo1 stronger than the second or at
+most elo0; the games still being played are then cancelled.
+
+Usage: python3 tournament.py [options] AGENT1 AGENT2
+"""
+
+import importlib
+import io
+import contextlib
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import random
+import time
+import xmlrpc.client
+
+from quoridor import Agent, Board
+from game import Game, connect_agent
+import transport
+
+
+def load_agent(spec):
+    """Return the agent class of spec, module:Class."""
+    module_name, _, class_name = spec.partition(':')
+    if not module_name or not class_name:
+        raise ValueError("%s is not of the form module:Class" % spec)
+    agent_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(agent_class, type) and issubclass(agent_class, Agent)):
+        raise ValueError("%s is not an Agent class" % spec)
+    return agent_class
+
+
+def is_uri(spec):
+    """Return whether spec is the URI of an agent server."""
+    return '://' in spec
+
+
+def make_agent(spec, session):
+    """Return the agent of spec: a new instance of module:Class, or the
+    proxy of the agent server at the URI spec. For XML-RPC, session is
+    added to the path of the URI to name the session of the game; the
+    binary transport opens a session per connection.
+    """
+    if not is_uri(spec):
+        return load_agent(spec)()
+    if not transport.is_framed(spec):
+        spec = spec.rstrip('/') + '/' + session
+    return connect_agent(spec)
+
+
+def close_agent(agent):
+    """Close the session of agent on its server, if it is remote."""
+    if isinstance(agent, transport.FramedProxy):
+        # Closing the connection closes the session
+        agent.close()
+    elif isinstance(agent, xmlrpc.client.ServerProxy):
+        try:
+            agent.close()
+        except (OSError, xmlrpc.client.Error):
+            # A server without sessions, or that already expired it
+            pass
+
+
+def play_game(task):
+    """Play one game in a worker process and return the tuple (index, swap,
+    trace, elapsed, error): the trace of the game, or None and the message
+    of the exception raised by an agent.
+    """
+    index, specs, swap, time_limit, seed = task
+    random.seed(seed)
+    if swap:
+        specs = specs[::-1]
+    start = time.perf_counter()
+    agents = []
+    try:
+        for player, spec in enumerate(specs):
+            agents.append(make_agent(spec, "game%d-%08x-%d" %
+                                     (index, seed, player)))
+        game = Game(agents, Board(), credits=[time_limit, time_limit])
+        # The agents print their own traces of the search
+        with contextlib.redirect_stdout(io.StringIO()):
+            game.play()
+    except Exception as e:
+        return index, swap, None, time.perf_counter() - start, \
+            "%s: %s" % (type(e).__name__, e)
+    finally:
+        for agent in agents:
+            close_agent(agent)
+    return index, swap, game.trace, time.perf_counter() - start, None
+
+
+class GameResult:
+
+    """Result of one game of a tournament.
+
+    Attributes:
+    index -- number of the game, from 0
+    swap -- whether the second agent played first (blue)
+    trace -- the Trace of the game, None if it failed
+    elapsed -- seconds taken by the game
+    error -- message of the exception that stopped the game, or None
+    """
+
+    def __init__(self, index, swap, trace, elapsed, error):
+        self.index = index
+        self.swap = swap
+        self.trace = trace
+        self.elapsed = elapsed
+        self.error = error
+
+    def player_of(self, agent):
+        """Return the player of agent (0 or 1) in this game."""
+        return agent ^ self.swap
+
+    def winner(self):
+        """Return the agent who won (0 or 1), None for a draw or a failed
+        game.
+        """
+        if self.trace is None or self.trace.winner == 0:
+            return None
+        return self.player_of(0 if self.trace.winner > 0 else 1)
+
+    def moves(self, agent=None):
+        """Return the list of the times of the moves of agent, of both if
+        agent is None.
+        """
+        if self.trace is None:
+            return []
+        return [t for player, _, t in self.trace.actions
+                if agent is None or player == self.player_of(agent)]
+
+
+def expected_score(elo):
+    """Return the expected score of a player elo points stronger."""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score):
+    """Return the Elo difference giving the expected score."""
+    return -400 * math.log10(1 / score - 1)
+
+
+class SPRT:
+
+    """Sequential probability ratio test of the results of the first agent.
+
+    The hypotheses are H0: the first agent is elo0 stronger than the second
+    and H1: it is elo1 stronger. The log-likelihood ratio of the results is
+    the one of the normal approximation of the win/draw/loss model used by
+    chess testing frameworks. The test accepts H1 once it reaches
+    log((1 - beta) / alpha), and H0 once it falls to log(beta / (1 - alpha)).
+    """
+
+    def __init__(self, elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05):
+        """
+        Arguments:
+        elo0, elo1 -- Elo differences of H0 and H1, elo0 < elo1
+        alpha -- probability of accepting H1 when H0 holds
+        beta -- probability of accepting H0 when H1 holds
+        """
+        if not elo0 < elo1:
+            raise ValueError("elo0 must be lower than elo1")
+        if not (0 < alpha < 1 and 0 < beta < 1):
+            raise ValueError("alpha and beta must be between 0 and 1")
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.alpha = alpha
+        self.beta = beta
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.wins = self.draws = self.losses = 0
+
+    def add(self, winner):
+        """Count one game won by agent winner (0 or 1), None for a draw,
+        and return the status of the test.
+        """
+        if winner is None:
+            self.draws += 1
+        elif winner == 0:
+            self.wins += 1
+        else:
+            self.losses += 1
+        return self.status()
+
+    def llr(self):
+        """Return the log-likelihood ratio of H1 against H0."""
+        if not self.wins + self.draws + self.losses:
+            return 0.0
+        # Half a game of each result never seen keeps the variance positive
+        wins, draws, losses = [count or 0.5 for count in
+                               (self.wins, self.draws, self.losses)]
+        games = wins + draws + losses
+        score = (wins + draws / 2) / games
+        variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 +
+                    losses * score ** 2) / games
+        score0 = expected_score(self.elo0)
+        score1 = expected_score(self.elo1)
+        return (score1 - score0) * (2 * score - score0 - score1) * \
+            games / (2 * variance)
+
+    def status(self):
+        """Return 'H1' or 'H0' if the test accepted it, None otherwise."""
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def confidence(self):
+        """Return the probability that the test would not have reached its
+        decision by chance: 1 - alpha for H1, 1 - beta for H0, and for an
+        unfinished test the one of the bound the ratio is closest to, scaled
+        by how far it went towards it.
+        """
+        llr = self.llr()
+        if llr >= 0:
+            reached = min(1.0, llr / self.upper)
+            return reached * (1 - self.alpha)
+        reached = min(1.0, llr / self.lower)
+        return reached * (1 - self.beta)
+
+    def report(self, spec):
+        """Print the state of the test, spec being the first agent."""
+        status = self.status()
+        if status == 'H1':
+            verdict = "H1 accepted: %s is at least %g Elo stronger" % \
+                (spec, self.elo1)
+        elif status == 'H0':
+            verdict = "H0 accepted: %s is at most %g Elo stronger" % \
+                (spec, self.elo0)
+        else:
+            verdict = "inconclusive"
+        print("SPRT [%g, %g] alpha %g beta %g: LLR %.2f (%.2f, %.2f), %s" %
+              (self.elo0, self.elo1, self.alpha, self.beta, self.llr(),
+               self.lower, self.upper, verdict))
+        games = self.wins + self.draws + self.losses
+        score = (self.wins + self.draws / 2) / games if games else 0.5
+        elo = elo_difference(score) if 0 < score < 1 else \
+            math.copysign(math.inf, score - 0.5)
+        print("%d games (+%d =%d -%d), score %.1f%%, %+.0f Elo,"
+              " confidence %.1f%%" %
+              (games, self.wins, self.draws, self.losses, 100 * score, elo,
+               100 * self.confidence()))
+
+
+class Tournament:
+
+    """Games between two agents on a pool of worker processes."""
+
+    def __init__(self, specs, games, processes=None, time_limit=None,
+                 seed=None, sprt=None):
+        """
+        Arguments:
+        specs -- the two agents, as module:Class or URI of an agent server
+        games -- number of games, the most played if sprt is given
+        processes -- number of worker processes (default: one per core)
+        time_limit -- time credit of each agent in each game, in seconds,
+            or None for untimed games
+        seed -- seed of the seeds of the games (None for random)
+        sprt -- SPRT stopping the match once it is decided, or None
+        """
+        for spec in specs:
+            if is_uri(spec):
+                if transport.is_framed(spec):
+                    transport.parse_uri(spec)
+            else:
+                load_agent(spec)
+        self.specs = tuple(specs)
+        self.games = games
+        self.processes = processes or os.cpu_count() or 1
+        self.time_limit = time_limit
+        self.random = random.Random(seed)
+        self.sprt = sprt
+        self.results = []
+        self.cancelled = 0
+        self.elapsed = 0.0
+
+    def tasks(self):
+        """Return the tasks of play_game(), the colours alternating."""
+        return [(index, self.specs, index % 2 == 1, self.time_limit,
+                 self.random.getrandbits(32)) for index in range(self.games)]
+
+    def run(self, callback=None):
+        """Play the games and return the list of their GameResult, in the
+        order they finished. callback, if given, is called with each
+        GameResult as soon as its game is over.
+
+        A game is started each time a worker is free, until the SPRT, if
+        any, is decided: the games in progress are then cancelled.
+        """
+        self.results = []
+        self.cancelled = 0
+        start = time.perf_counter()
+        finished = queue.Queue()
+        tasks = iter(self.tasks())
+        running = 0
+        with multiprocessing.Pool(self.processes) as pool:
+            def schedule():
+                task = next(tasks, None)
+                if task is None:
+                    return 0
+                pool.apply_async(play_game, (task,), callback=finished.put,
+                                 error_callback=finished.put)
+                return 1
+
+            for _ in range(self.processes):
+                running += schedule()
+            while running:
+                result = finished.get()
+                running -= 1
+                if isinstance(result, BaseException):
+                    raise result
+                result = GameResult(*result)
+                self.results.append(result)
+                if callback is not None:
+                    callback(result)
+                if self.sprt is not None and result.trace is not None and \
+                        self.sprt.add(result.winner()) is not None:
+                    break
+                running += schedule()
+            # Leaving the pool terminates the games still in progress
+            self.cancelled = running
+        self.elapsed = time.perf_counter() - start
+        return self.results
+
+    def report(self):
+        """Print the statistics of the games played."""
+        results = [r for r in self.results if r.trace is not None]
+        failed = len(self.results) - len(results)
+        print("%d games, %d failed, %d cancelled, %.1f s, %.1f games/min,"
+              " %d processes" %
+              (len(self.results), failed, self.cancelled, self.elapsed,
+               60 * len(self.results) / self.elapsed if self.elapsed else 0,
+               self.processes))
+        if self.sprt is not None:
+            self.sprt.report(self.specs[0])
+        if not results:
+            return
+        draws = sum(r.winner() is None for r in results)
+        for agent, spec in enumerate(self.specs):
+            wins = sum(r.winner() == agent for r in results)
+            times = [t for r in results for t in r.moves(agent)]
+            first = [r for r in results if r.player_of(agent) == 0]
+            first_wins = sum(r.winner() == agent for r in first)
+            print("%-28s %4d wins %5.1f%%  %5.1f%% as blue  %6.3f s/move" %
+                  (spec, wins, 100.0 * (wins + draws / 2) / len(results),
+                   100.0 * first_wins / len(first) if first else 0,
+                   sum(times) / len(times) if times else 0))
+        lengths = [len(r.moves()) for r in results]
+        print("%-28s %4d draws  %5.1f moves per game (%d to %d)" %
+              ("", draws, sum(lengths) / len(lengths), min(lengths),
+               max(lengths)))
+        reasons = {}
+        for r in results:
+            if r.trace.reason:
+                reasons[r.trace.reason] = reasons.get(r.trace.reason, 0) + 1
+        for reason, count in sorted(reasons.items()):
+            print("%-28s %4d games: %s" % ("", count, reason))
+        for r in self.results:
+            if r.error is not None:
+                print("game %d failed: %s" % (r.index, r.error))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    def posfloatarg(string):
+        value = float(string)
+        if value <= 0:
+            raise argparse.ArgumentTypeError("%s is not strictly positive" %
+                                             string)
+        return value
+
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [options] AGENT1 AGENT2")
+    parser.add_argument("agent1", help="first agent, as module:Class or URI",
+                        metavar="AGENT1")
+    parser.add_argument("agent2", help="second agent, as module:Class or URI",
+                        metavar="AGENT2")
+    parser.add_argument("-n", "--games", type=int, default=10,
+                        help="number of games, the most played with --sprt" +
+                             " (default: %(default)s)")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="number of games played at once (default: one" +
+                             " per core)")
+    parser.add_argument("-t", "--time", type=posfloatarg,
+                        help="set the time credit per player (default:" +
+                             " untimed games)",
+                        metavar="SECONDS")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the games (default: random)")
+    parser.add_argument("-o", "--traces",
+                        help="write the trace of each game to DIR for" +
+                             " replay with game.py -r",
+                        metavar="DIR")
+    g = parser.add_argument_group("Sequential test")
+    g.add_argument("--sprt", action="store_true", default=False,
+                   help="stop once an SPRT tells whether AGENT1 is stronger")
+    g.add_argument("--elo0", type=float, default=0.0,
+                   help="Elo difference of H0 (default: %(default)s)")
+    g.add_argument("--elo1", type=float, default=10.0,
+                   help="Elo difference of H1 (default: %(default)s)")
+    g.add_argument("--alpha", type=float, default=0.05,
+                   help="probability of accepting H1 by error" +
+                        " (default: %(default)s)")
+    g.add_argument("--beta", type=float, default=0.05,
+                   help="probability of accepting H0 by error" +
+                        " (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="print each game as it finishes")
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error("argument -n/--games: must be at least 1")
+    if args.processes is not None and args.processes < 1:
+        parser.error("argument -j/--processes: must be at least 1")
+    logging.basicConfig(format="%(asctime)s -- %(levelname)s: %(message)s",
+                        level=logging.WARNING)
+    sprt = None
+    if args.sprt:
+        try:
+            sprt = SPRT(args.elo0, args.elo1, args.alpha, args.beta)
+        except ValueError as e:
+            parser.error("argument --sprt: %s" % e)
+    try:
+        tournament = Tournament([args.agent1, args.agent2], args.games,
+                                args.processes, args.time, args.seed, sprt)
+    except (ImportError, AttributeError, ValueError) as e:
+        parser.error("unable to load agent: %s" % e)
+    if args.traces is not None:
+        os.makedirs(args.traces, exist_ok=True)
+
+    def finished(result):
+        if args.verbose:
+            winner = result.winner()
+            print("game %d: %s in %d moves, %.1f s" %
+                  (result.index, result.error or "draw" if winner is None
+                   else "%s wins" % tournament.specs[winner],
+                   len(result.moves()), result.elapsed))
+        if args.traces is not None and result.trace is not None:
+            path = os.path.join(args.traces, "game-%04d.trace" % result.index)
+            with open(path, 'wb') as f:
+                result.trace.write(f)
+
+    tournament.run(finished)
+    tournament.report()
@@ -0,0 +1,348 @@
+"""
+Binary transport between the game and the agents.
+
+XML-RPC opens an HTTP connection for every call and sends the board as
+XML. This transport keeps one connection per agent open for the whole game
+and sends length-prefixed binary frames: a 4-byte big-endian length, then
+the payload. A request is the code of the method followed by its
+arguments, a reply a status byte followed by the result or by the message
+of the exception raised by the agent.
+
+The board takes 24 bytes: the size and the walls at the start, the cells
+x * size + y of the pawns, the goal rows, the walls left, then the
+horizontal and the vertical walls as masks of slots x * 8 + y, the layout
+of quoridor.py. The walls are decoded in slot order, not in the order they
+were placed.
+
+The incremental agents of quoridor.py are sent the last action instead
+of the board: 3 bytes for the action, then the player, the step, the
+64-bit hash of the position and the time left. The reply to initialize()
+carries a byte of flags, 1 for an incremental agent.
+
+The agents are reached by URI: tcp://host:port for a TCP connection and
+unix:///path for a Unix socket. Other URIs are left to XML-RPC.
+
+A server has a thread per connection, but runs the calls on its agent one
+at a time, as the XML-RPC server does. Several games, or both players of a
+game, can thus connect to the same agent, but they share its state: an
+incremental agent is then resynced at each move. session_server.py gives
+each game its own agent.
+"""
+
+import math
+import os
+import socket
+import socketserver
+import struct
+import threading
+import urllib.parse
+
+FRAME = struct.Struct('>I')
+BOARD = struct.Struct('>8B2Q')
+PLAY = struct.Struct('>BId')
+INCREMENTAL = struct.Struct('>BIQd')
+TIME = struct.Struct('>d')
+ACTION = struct.Struct('>3B')
+
+SCHEMES = ('tcp', 'unix')
+
+# Codes of the methods and of the replies
+INITIALIZE = 1
+PLAY_MOVE = 2
+PLAY_INCREMENTAL = 3
+RESYNC = 4
+OK = 0
+ERROR = 1
+
+ACTION_KINDS = ('P', 'WH', 'WV')
+NO_ACTION = 255
+
+# Flags of the reply to initialize()
+FLAG_INCREMENTAL = 1
+
+
+class RemoteError(Exception):
+    """The agent raised an exception while handling a call."""
+
+
+def is_framed(uri):
+    """Return whether uri is served by this transport."""
+    return urllib.parse.urlsplit(uri).scheme in SCHEMES
+
+
+def parse_uri(uri):
+    """Return the pair (family, address) of the socket of uri."""
+    parts = urllib.parse.urlsplit(uri)
+    if parts.scheme == 'tcp':
+        if parts.port is None:
+            raise ValueError("%s has no port" % uri)
+        return socket.AF_INET, (parts.hostname or '', parts.port)
+    if parts.scheme == 'unix':
+        path = parts.netloc + parts.path
+        if not path:
+            raise ValueError("%s has no path" % uri)
+        return socket.AF_UNIX, path
+    raise ValueError("%s is not a tcp:// or unix:// URI" % uri)
+
+
+def encode_board(percepts):
+    """Return the bytes of the board of percepts, a dictionary as given by
+    Board.get_percepts().
+    """
+    size = percepts['size']
+    horiz = verti = 0
+    for (x, y) in percepts['horiz_walls']:
+        horiz |= 1 << (x * (size - 1) + y)
+    for (x, y) in percepts['verti_walls']:
+        verti |= 1 << (x * (size - 1) + y)
+    ((x0, y0), (x1, y1)) = percepts['pawns']
+    return BOARD.pack(size, percepts['starting_walls'], x0 * size + y0,
+                      x1 * size + y1, percepts['goals'][0],
+                      percepts['goals'][1], percepts['nb_walls'][0],
+                      percepts['nb_walls'][1], horiz, verti)
+
+
+def decode_board(data, offset=0):
+    """Return the percepts encoded in data at offset."""
+    (size, starting_walls, cell0, cell1, goal0, goal1, walls0, walls1,
+     horiz, verti) = BOARD.unpack_from(data, offset)
+    slots = size - 1
+    return {
+        'size': size,
+        'rows': size,
+        'cols': size,
+        'starting_walls': starting_walls,
+        'pawns': [divmod(cell0, size), divmod(cell1, size)],
+        'goals': [goal0, goal1],
+        'nb_walls': [walls0, walls1],
+        'horiz_walls': [divmod(k, slots) for k in range(slots * slots)
+                        if horiz >> k & 1],
+        'verti_walls': [divmod(k, slots) for k in range(slots * slots)
+                        if verti >> k & 1],
+    }
+
+
+def encode_time(time_left):
+    return TIME.pack(math.nan if time_left is None else time_left)
+
+
+def decode_time(data, offset=0):
+    (time_left,) = TIME.unpack_from(data, offset)
+    return None if math.isnan(time_left) else time_left
+
+
+def encode_action(action):
+    if action is None:
+        return ACTION.pack(NO_ACTION, 0, 0)
+    kind, x, y = action
+    return ACTION.pack(ACTION_KINDS.index(kind), x, y)
+
+
+def decode_action(data, offset=0):
+    kind, x, y = ACTION.unpack_from(data, offset)
+    if kind == NO_ACTION:
+        return None
+    return (ACTION_KINDS[kind], x, y)
+
+
+def send_frame(sock, payload):
+    sock.sendall(FRAME.pack(len(payload)) + payload)
+
+
+def recv_exactly(sock, size):
+    """Return the next size bytes of sock, raising ConnectionError if the
+    connection is closed before.
+    """
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock):
+    (size,) = FRAME.unpack(recv_exactly(sock, FRAME.size))
+    return recv_exactly(sock, size)
+
+
+class FramedProxy:
+
+    """Remote agent reached by the binary transport.
+
+    It has the methods of Agent. The connection is opened by the first
+    call and kept for the next ones. Each call waits at most
+    socket.getdefaulttimeout() seconds, as for the XML-RPC proxies, so that
+    Game.timed_exec() can bound it.
+    """
+
+    def __init__(self, uri):
+        self.family, self.address = parse_uri(uri)
+        self.sock = None
+
+    def connect(self):
+        if self.sock is None:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(socket.getdefaulttimeout())
+            try:
+                sock.connect(self.address)
+            except OSError:
+                sock.close()
+                raise
+            if self.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+        return self.sock
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def call(self, request):
+        """Send request and return the payload of the reply."""
+        sock = self.connect()
+        sock.settimeout(socket.getdefaulttimeout())
+        try:
+            send_frame(sock, request)
+            reply = recv_frame(sock)
+        except OSError:
+            # The stream may be left in the middle of a frame
+            self.close()
+            raise
+        if reply[0] == ERROR:
+            raise RemoteError(reply[1:].decode('utf-8', 'replace'))
+        return reply[1:]
+
+    def initialize(self, percepts, players, time_left):
+        reply = self.call(bytes([INITIALIZE]) + encode_board(percepts) +
+                          bytes([len(players)]) + bytes(players) +
+                          encode_time(time_left))
+        if reply and reply[0] & FLAG_INCREMENTAL:
+            return {'incremental': True}
+        return None
+
+    def play(self, percepts, player, step, time_left):
+        return self.play_board(PLAY_MOVE, percepts, player, step, time_left)
+
+    def play_incremental(self, action, player, step, board_hash, time_left):
+        reply = self.call(bytes([PLAY_INCREMENTAL]) + encode_action(action) +
+                          INCREMENTAL.pack(player, step, int(board_hash, 16),
+                                           math.nan if time_left is None
+                                           else time_left))
+        return decode_action(reply)
+
+    def resync(self, percepts, player, step, time_left):
+        return self.play_board(RESYNC, percepts, player, step, time_left)
+
+    def play_board(self, method, percepts, player, step, time_left):
+        reply = self.call(bytes([method]) + encode_board(percepts) +
+                          PLAY.pack(player, step, math.nan
+                                    if time_left is None else time_left))
+        return decode_action(reply)
+
+
+def handle_request(agent, request):
+    """Run request on agent and return the payload of the reply."""
+    try:
+        method = request[0]
+        if method == INITIALIZE:
+            percepts = decode_board(request, 1)
+            offset = 1 + BOARD.size
+            count = request[offset]
+            players = list(request[offset + 1:offset + 1 + count])
+            time_left = decode_time(request, offset + 1 + count)
+            result = agent.initialize(percepts, players, time_left)
+            flags = 0
+            if isinstance(result, dict) and result.get('incremental'):
+                flags |= FLAG_INCREMENTAL
+            return bytes([OK, flags])
+        if method in (PLAY_MOVE, RESYNC):
+            percepts = decode_board(request, 1)
+            player, step, time_left = PLAY.unpack_from(request,
+                                                       1 + BOARD.size)
+            if math.isnan(time_left):
+                time_left = None
+            play = agent.play if method == PLAY_MOVE else agent.resync
+            action = play(percepts, player, step, time_left)
+            return bytes([OK]) + encode_action(action)
+        if method == PLAY_INCREMENTAL:
+            action = decode_action(request, 1)
+            player, step, board_hash, time_left = INCREMENTAL.unpack_from(
+                request, 1 + ACTION.size)
+            if math.isnan(time_left):
+                time_left = None
+            action = agent.play_incremental(action, player, step,
+                                            '%016x' % board_hash, time_left)
+            return bytes([OK]) + encode_action(action)
+        raise ValueError("unknown method %d" % method)
+    except Exception as e:
+        return bytes([ERROR]) + ("%s: %s" % (type(e).__name__, e)).encode()
+
+
+class FramedHandler(socketserver.BaseRequestHandler):
+
+    """Serves the calls of one connection until it is closed."""
+
+    def setup(self):
+        self.agent = self.server.agent
+
+    def call(self, request):
+        """Run request on the agent, one call of all the connections at a
+        time, and return the payload of the reply.
+        """
+        with self.server.lock:
+            return handle_request(self.agent, request)
+
+    def handle(self):
+        sock = self.request
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                request = recv_frame(sock)
+            except ConnectionError:
+                return
+            send_frame(sock, self.call(request))
+
+
+class FramedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FramedUnixServer(socketserver.ThreadingMixIn,
+                       socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(agent, uri, handler=FramedHandler):
+    """Return the server of agent listening on uri, a thread per
+    connection and one call at a time, the connections being served by
+    the class handler.
+    """
+    family, address = parse_uri(uri)
+    if family == socket.AF_UNIX:
+        # The socket left by a previous server would prevent the bind
+        if os.path.exists(address):
+            os.unlink(address)
+        server = FramedUnixServer(address, handler)
+    else:
+        server = FramedTCPServer(address, handler)
+    server.agent = agent
+    server.lock = threading.Lock()
+    return server
+
+
+def serve_framed(agent, uri):
+    """Serve agent on uri until interrupted."""
+    server = make_server(agent, uri)
+    print("Listening on", uri)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
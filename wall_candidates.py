@@ -0,0 +1,271 @@
+"""
+Candidate walls of the Monte Carlo agents.
+
+The agents only consider the walls next to the walls already placed and the
+walls across the shortest path of the opponent. These candidates overlap a
+lot, so they are gathered in two bitmasks of wall slots, one per orientation,
+which removes the duplicates. The slots taken or overlapping a wall of the
+same orientation are then removed with masks computed once per wall
+configuration from the conflict tables of quoridor.py, and only the slots
+left get the path check.
+
+Everything that only depends on the walls is kept in a WallLayout, shared by
+all the positions with the same walls: the masks of free slots, the connected
+parts of the walls, and the path checks already made. Most walls need no
+flood fill at all: a wall that closes no region cannot cut a path, see
+WallLayout.legal_walls(). The walls leaving a path only through the opponent
+pawn need the exact search of the board, as in Board.is_wall_possible_here();
+they are returned apart, to be checked if they are ever played.
+
+The wall slots use the bit layout described in quoridor.py.
+"""
+
+from quoridor import (SIZE, WALL_SIZE, HORIZ_WALL_EDGES, VERTI_WALL_EDGES,
+                      HORIZ_WALL_CONFLICTS, VERTI_WALL_CONFLICTS,
+                      flood_path_exists)
+
+ALL_SLOTS = (1 << (WALL_SIZE * WALL_SIZE)) - 1
+
+# The walls run between the corners of the cells, the points (r, c) of a
+# 10 x 10 grid numbered r * 10 + c
+POINTS = SIZE + 1
+BORDER_POINTS = sum(1 << (r * POINTS + c) for r in range(POINTS)
+                    for c in range(POINTS)
+                    if r in (0, SIZE) or c in (0, SIZE))
+# Points covered by the wall in slot x * 8 + y
+HORIZ_WALL_POINTS = [sum(1 << ((x + 1) * POINTS + y + i) for i in range(3))
+                     for x in range(WALL_SIZE) for y in range(WALL_SIZE)]
+VERTI_WALL_POINTS = [sum(1 << ((x + i) * POINTS + y + 1) for i in range(3))
+                     for x in range(WALL_SIZE) for y in range(WALL_SIZE)]
+# Corners of the cell x * 9 + y
+CELL_POINTS = [sum(1 << ((x + i) * POINTS + y + j)
+                   for i in (0, 1) for j in (0, 1))
+               for x in range(SIZE) for y in range(SIZE)]
+
+# Number of wall configurations kept by wall_layout()
+MAX_LAYOUTS = 4096
+# Number of path checks kept by a WallLayout, the pawns moving on
+MAX_CHECKED = 1024
+
+_layouts = {}
+
+
+def _slot(x, y):
+    """Return the bit of wall slot (x, y), 0 if outside the board."""
+    if 0 <= x < WALL_SIZE and 0 <= y < WALL_SIZE:
+        return 1 << (x * WALL_SIZE + y)
+    return 0
+
+
+def _slots(mask):
+    """Yield the indexes of the slots set in mask, in increasing order."""
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        yield bit.bit_length() - 1
+
+
+def _merge(components, points):
+    """Return the connected sets of points of components once points is
+    added, merging the sets it touches.
+    """
+    merged = []
+    for component in components:
+        if component & points:
+            points |= component
+        else:
+            merged.append(component)
+    merged.append(points)
+    return merged
+
+
+def _closes_region(components, covered, points):
+    """Return True if the wall covering points touches one of the connected
+    sets of points of components, which cover the points covered, at two
+    points or more.
+    """
+    if bin(covered & points).count('1') < 2:
+        return False
+    for component in components:
+        if bin(component & points).count('1') > 1:
+            return True
+    return False
+
+
+class WallLayout:
+
+    """The walls that can be added to one wall configuration."""
+
+    def __init__(self, goals, horiz_mask, verti_mask, blocked_down,
+                 blocked_right):
+        self.goals = tuple(goals)
+        self.blocked_down = blocked_down
+        self.blocked_right = blocked_right
+        # A slot is free if no wall takes it and no wall of the same
+        # orientation overlaps it; the conflicts are symmetric
+        taken = horiz_mask | verti_mask
+        forbidden = taken
+        for k in _slots(horiz_mask):
+            forbidden |= HORIZ_WALL_CONFLICTS[k]
+        self.free_horiz = ALL_SLOTS & ~forbidden
+        forbidden = taken
+        for k in _slots(verti_mask):
+            forbidden |= VERTI_WALL_CONFLICTS[k]
+        self.free_verti = ALL_SLOTS & ~forbidden
+        # Connected sets of the points touched by the walls or the border
+        self.components = [BORDER_POINTS]
+        for k in _slots(horiz_mask):
+            self.components = _merge(self.components, HORIZ_WALL_POINTS[k])
+        for k in _slots(verti_mask):
+            self.components = _merge(self.components, VERTI_WALL_POINTS[k])
+        self.points = 0
+        for component in self.components:
+            self.points |= component
+        # (k, is_horiz, player, cells of the pawns) -> result of path_check()
+        self.checked = {}
+        # Cells of the pawns -> result of clear_paths()
+        self.clear = {}
+
+    def clear_paths(self, cells):
+        """Return for each player whether its pawn, with the pawns in cells,
+        can reach its goal without going through the cell of the opponent.
+        """
+        clear = self.clear.get(cells)
+        if clear is None:
+            clear = self.clear[cells] = tuple(
+                self._flood_path(player, cells, self.blocked_down,
+                                 self.blocked_right) is True
+                for player in (0, 1))
+        return clear
+
+    def _flood_path(self, player, cells, blocked_down, blocked_right):
+        return flood_path_exists(cells[player], cells[1 - player],
+                                 self.goals[player], blocked_down,
+                                 blocked_right)
+
+    def path_check(self, k, is_horiz, player, cells):
+        """Return whether the pawn of player keeps a path to its goal once
+        the wall of slot k is added, as Board._flood_path_exists() decides:
+        True, False or None if its paths all go through the opponent pawn.
+        The last MAX_CHECKED checks are kept.
+        """
+        key = (k, is_horiz, player, cells)
+        found = self.checked.get(key, ())
+        if found == ():
+            blocked_down, blocked_right = self.blocked_down, self.blocked_right
+            if is_horiz:
+                blocked_down |= HORIZ_WALL_EDGES[k]
+            else:
+                blocked_right |= VERTI_WALL_EDGES[k]
+            found = self._flood_path(player, cells, blocked_down,
+                                     blocked_right)
+            if len(self.checked) >= MAX_CHECKED:
+                del self.checked[next(iter(self.checked))]
+            self.checked[key] = found
+        return found
+
+    def legal_walls(self, horiz, verti, board):
+        """Return the pair of lists (legal, unchecked) of the actions of the
+        slots of the masks horiz and verti that may be placed on board:
+        legal holds the walls known to be legal and unchecked the ones that
+        need the exact search of the board.
+
+        For a player, the cells are the faces of the graph made of the
+        walls, the border and the square of the cell of the opponent pawn.
+        A wall touching each connected part of this graph at one point at
+        most closes no region, so a player who had a path avoiding the
+        opponent pawn keeps it. Otherwise the wall is checked as in
+        Board.is_wall_possible_here(): a pawn that reaches its goal without
+        going through the opponent pawn has a path, and a pawn that cannot
+        reach it at all has none. Only the walls that leave a path through
+        the opponent pawn are left unchecked.
+        """
+        cells = tuple(x * SIZE + y for (x, y) in board.pawns)
+        clear = self.clear_paths(cells)
+        # The connected parts of the graph of each player, and the points
+        # they cover, None if the player has no path avoiding the opponent
+        components = [None, None]
+        covered = [None, None]
+        for player in (0, 1):
+            if clear[player]:
+                square = CELL_POINTS[cells[1 - player]]
+                components[player] = _merge(self.components, square)
+                covered[player] = self.points | square
+        legal = []
+        unchecked = []
+        for kind, mask, is_horiz, wall_points in (
+                ('WH', horiz & self.free_horiz, True, HORIZ_WALL_POINTS),
+                ('WV', verti & self.free_verti, False, VERTI_WALL_POINTS)):
+            for k in _slots(mask):
+                points = wall_points[k]
+                found = True
+                for player in (0, 1):
+                    if covered[player] is not None and \
+                            not _closes_region(components[player],
+                                               covered[player], points):
+                        continue
+                    result = self.path_check(k, is_horiz, player, cells)
+                    if result is False:
+                        found = False
+                        break
+                    if result is None:
+                        found = None
+                action = (kind, k // WALL_SIZE, k % WALL_SIZE)
+                if found:
+                    legal.append(action)
+                elif found is None:
+                    unchecked.append(action)
+        return legal, unchecked
+
+
+def wall_layout(board):
+    """Return the WallLayout of the walls of board. The layouts of the last
+    MAX_LAYOUTS wall configurations are kept.
+    """
+    horiz_mask, verti_mask, blocked_down, blocked_right = board.get_masks()
+    key = (tuple(board.goals), horiz_mask, verti_mask)
+    layout = _layouts.get(key)
+    if layout is None:
+        if len(_layouts) >= MAX_LAYOUTS:
+            del _layouts[next(iter(_layouts))]
+        layout = _layouts[key] = WallLayout(board.goals, horiz_mask,
+                                            verti_mask, blocked_down,
+                                            blocked_right)
+    return layout
+
+
+def candidate_walls(board, player, opp_moves):
+    """Return the walls player may place on board: next to the walls
+    already placed, across opp_moves, the shortest path of the opponent, and
+    in front of the opponent pawn. Each wall is returned once, in the pair
+    of lists (legal, unchecked) described in WallLayout.legal_walls().
+    """
+    horiz = verti = 0
+
+    # Vertical walls adjacent to the horizontal walls
+    for (wall_y, wall_x) in board.horiz_walls:
+        verti |= _slot(wall_y + 1, wall_x - 1) | \
+            _slot(wall_y + 1, wall_x + 1) | \
+            _slot(wall_y, wall_x - 1) | _slot(wall_y, wall_x + 1)
+
+    # Horizontal walls adjacent to the vertical walls
+    for (wall_y, wall_x) in board.verti_walls:
+        horiz |= _slot(wall_y + 2, wall_x + 1) | \
+            _slot(wall_y + 2, wall_x - 1) | \
+            _slot(wall_y - 1, wall_x + 1) | _slot(wall_y - 1, wall_x - 1) | \
+            _slot(wall_y + 1, wall_x + 1) | _slot(wall_y + 1, wall_x - 1)
+
+    # Walls on the shortest path of the opponent
+    for (x, y) in opp_moves:
+        horiz |= _slot(x, y) | _slot(x, y - 1)
+        verti |= _slot(x, y - 1) | _slot(x + 1, y - 1)
+
+    # Walls in front of the opponent
+    opponent = 1 - player
+    oppo_y, oppo_x = board.pawns[opponent]
+    if board.goals[opponent] < oppo_y:
+        horiz |= _slot(oppo_y - 1, oppo_x) | _slot(oppo_y - 1, oppo_x - 1)
+    else:
+        horiz |= _slot(oppo_y, oppo_x) | _slot(oppo_y, oppo_x - 1)
+
+    return wall_layout(board).legal_walls(horiz, verti, board)